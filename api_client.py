@@ -0,0 +1,46 @@
+"""
+Tiny HTTP client shared by the load test scripts (stdlib only, no server imports)
+"""
+
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class ApiClient:
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def call(self, method, path, token=None, json_body=None, form=None):
+        """Send one request, returns (status code, decoded JSON body)"""
+        headers = {}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"null")
+
+    def register(self, name, address="Load test"):
+        """Register a throwaway user, returns its access token"""
+        status, body = self.call("POST", "/api/register", json_body={
+            "email": f"{name}@example.com",
+            "username": name,
+            "password": "password123",
+            "full_name": name,
+            "phone": "0000000000",
+            "address": address,
+        })
+        assert status == 200, body
+        return body["access_token"]
@@ -47,5 +47,79 @@ def get_db():
 
 def init_db():
     from app.models import Base
+    from app.utils.search import install_search_index
+    from app.utils.availability import install_booking_constraints
+    from app.utils.matching import rebuild_request_index, rebuild_request_matches, rebuild_owner_inventory
+    from app.utils.booking_stats import rebuild_booking_stats
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created")
+    ensure_indexes()
+    drop_retired_tables()
+    backfill_sort_columns()
+    install_search_index(engine)
+    install_booking_constraints(engine)
+    rebuild_request_index(engine)
+    rebuild_request_matches(engine)
+    rebuild_owner_inventory(engine)
+    rebuild_booking_stats(engine)
+
+
+def ensure_indexes():
+    """Create indexes declared on models that are missing from existing tables.
+
+    create_all only adds indexes when it creates the table itself, so indexes
+    added to a model later would otherwise never reach an existing database.
+    """
+    from app.models import Base
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ Could not create index {index.name}: {e}")
+
+
+# Tables no model maps any more, dropped from databases that still have them.
+# Broadcast feeds: new dress requests notify matching owners directly instead
+# (children first, broadcast_receipts references broadcast_notifications)
+RETIRED_TABLES = ["broadcast_receipts", "notification_watermarks", "broadcast_notifications"]
+
+
+def drop_retired_tables():
+    """Drop RETIRED_TABLES where they exist"""
+    from sqlalchemy import inspect, text
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table in RETIRED_TABLES:
+            if table in existing:
+                conn.execute(text(f"DROP TABLE {table}"))
+                print(f"🗑️ Dropped retired table {table}")
+
+
+# Keyset pagination sorts on these columns raw so their (column, id) indexes
+# are used; a NULL would end the page walk early, so they are NOT NULL.
+SORT_COLUMN_BACKFILLS = [
+    ("products", "created_at", "CURRENT_TIMESTAMP"),
+    ("products", "average_rating", "0"),
+    # A dress without a price can't be rented: list it as unavailable until the owner sets one
+    ("products", "price_per_day", "0"),
+    ("bookings", "created_at", "COALESCE(updated_at, CURRENT_TIMESTAMP)"),
+]
+
+
+def backfill_sort_columns():
+    """Fill NULLs left in keyset sort columns by older rows, then enforce NOT NULL.
+
+    create_all only applies nullable=False to new tables. PostgreSQL tables get
+    the constraint here; SQLite can't add it in place, so existing SQLite
+    tables rely on the backfill and the model defaults.
+    """
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE products SET is_available = false WHERE price_per_day IS NULL"))
+        for table, column, value in SORT_COLUMN_BACKFILLS:
+            filled = conn.execute(text(f"UPDATE {table} SET {column} = {value} WHERE {column} IS NULL")).rowcount
+            if filled:
+                print(f"🔧 Backfilled {filled} NULL {table}.{column}")
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
@@ -1,21 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from typing import Optional
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 from jose import jwt, JWTError
 
 from .database import engine, get_db, Base, init_db
-from .models import User, Product, DressRequest
+from .models import User, Product, DressRequest, RequestMatch
 from .schemas import UserCreate, UserResponse, Token
 from .utils.security import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from .routes import messages, users, products, cart, orders, reviews, bookings, profiles, images, requests, notifications, auth
 from .routes.password_reset import router as password_reset_router
+from .utils.cache import response_cache
+from .utils import outbox, availability, holds, scheduler, lifecycle, analytics  # register scheduled jobs
+from .utils.matching import ranked_matches, match_list_pending
+from .utils.pagination import encode_cursor, decode_cursor, apply_keyset, InvalidCursor
 
 load_dotenv()
 
@@ -51,8 +56,17 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    outbox.start_worker()
+    holds.start_sweeper()
+    scheduler.start_scheduler()
     print("🚀 Application started!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await outbox.stop_worker()
+    await holds.stop_sweeper()
+    await scheduler.stop_scheduler()
+
 # Mount static files
 if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -171,9 +185,13 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 @app.get("/api/requests/{request_id}/matches")
 async def get_matching_dresses(
     request_id: int,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     authorization: str = Header(None),
     db: Session = Depends(get_db)
 ):
+    """Matching dresses for a request, best match first (X-Next-Cursor for the next page)"""
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
 
@@ -211,22 +229,37 @@ async def get_matching_dresses(
     if dress_request.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    query = db.query(Product).filter(Product.is_available == True)
-
-    if hasattr(dress_request, 'dress_type') and dress_request.dress_type:
-        query = query.filter(Product.category.ilike(f"%{dress_request.dress_type}%"))
-    if hasattr(dress_request, 'size') and dress_request.size:
-        query = query.filter(Product.size == dress_request.size)
-    if hasattr(dress_request, 'budget_min') and dress_request.budget_min:
-        query = query.filter(Product.price_per_day >= dress_request.budget_min)
-    if hasattr(dress_request, 'budget_max') and dress_request.budget_max:
-        query = query.filter(Product.price_per_day <= dress_request.budget_max)
-
-    matches = query.all()
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, "score")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if match_list_pending(db, request_id):
+        # Just posted or edited: rank live until the outbox worker stores the list
+        ranked = ranked_matches(db, dress_request)
+        if after:
+            ranked = [item for item in ranked if (item[0], item[1]) < tuple(after)]
+        rows = db.query(Product, User.username).outerjoin(User, User.id == Product.owner_id).filter(
+            Product.id.in_([product_id for _, product_id in ranked[:limit + 1]])
+        ).all()
+        by_id = {dress.id: (dress, owner_name) for dress, owner_name in rows}
+        page = [(score, *by_id[product_id]) for score, product_id in ranked[:limit + 1] if product_id in by_id]
+    else:
+        # Stored list: one seek on (request_id, score, product_id), owners joined in
+        query = db.query(RequestMatch.score, Product, User.username).join(
+            Product, Product.id == RequestMatch.product_id
+        ).outerjoin(User, User.id == Product.owner_id).filter(RequestMatch.request_id == request_id)
+        page = apply_keyset(query, RequestMatch.score, RequestMatch.product_id, True, after).limit(limit + 1).all()
+
+    if len(page) > limit:
+        page = page[:limit]
+        last_score, last_dress, _ = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor("score", last_score, last_dress.id)
 
     results = []
-    for dress in matches:
-        owner = db.query(User).filter(User.id == dress.owner_id).first()
+    for score, dress, owner_name in page:
         image_url = None
         if hasattr(dress, 'image_url') and dress.image_url:
             image_url = dress.image_url if dress.image_url.startswith('http') else f"/uploads/{dress.image_url}"
@@ -238,8 +271,9 @@ async def get_matching_dresses(
             "size": dress.size,
             "color": dress.color,
             "image_url": image_url,
-            "owner_name": owner.username if owner else "Unknown",
-            "owner_id": dress.owner_id
+            "owner_name": owner_name or "Unknown",
+            "owner_id": dress.owner_id,
+            "score": score
         })
 
     return results
@@ -315,6 +349,20 @@ async def reset_password_page():
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/api/metrics")
+async def get_metrics(db: Session = Depends(get_db)):
+    """Cache and background worker counters (each gunicorn worker keeps its own)"""
+    return {
+        "pid": os.getpid(),
+        "response_cache": response_cache.stats(),
+        "facet_cache": products.facet_cache.stats(),
+        "interval_cache": availability.interval_cache.stats(),
+        "calendar_cache": availability.calendar_cache.stats(),
+        "outbox": outbox.outbox_metrics(db),
+        "holds": holds.hold_metrics(db),
+        "scheduler": scheduler.scheduler_metrics(db),
+    }
+
 
 if __name__ == "__main__":
     import uvicorn
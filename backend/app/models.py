@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Date, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Date, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -14,6 +14,23 @@ class RequestStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+# Booking statuses that hold a dress for their date range
+BLOCKING_BOOKING_STATUSES = ["pending", "confirmed", "active"]
+
+# Booking statuses whose price counts as the owner's earnings
+EARNING_BOOKING_STATUSES = ["confirmed", "active", "completed"]
+
+# Status changes an owner may make; expired is set by the lifecycle job only
+BOOKING_STATUS_TRANSITIONS = {
+    "pending": ["confirmed", "cancelled"],
+    "confirmed": ["active", "completed", "cancelled"],
+    "active": ["completed"],
+    "completed": [],
+    "cancelled": ["pending", "confirmed"],
+    "expired": ["confirmed", "cancelled"],
+}
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -54,7 +71,7 @@ class Product(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String, index=True)
     description = Column(Text)
-    price_per_day = Column(Float)
+    price_per_day = Column(Float, nullable=False)
     category = Column(String, index=True)
     size = Column(String)
     color = Column(String)
@@ -64,9 +81,9 @@ class Product(Base):
     location = Column(String, nullable=True, index=True)
     image_url = Column(String, nullable=True)
     is_available = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     total_bookings = Column(Integer, default=0)
-    average_rating = Column(Float, default=0.0)
+    average_rating = Column(Float, default=0.0, nullable=False)
     dress_type = Column(String, nullable=True, index=True)
     
     # Relationships - KEEP ONLY ONE of each!
@@ -77,6 +94,14 @@ class Product(Base):
     bookings = relationship("Booking", back_populates="dress", cascade="all, delete-orphan")
     reviews = relationship("Review", back_populates="dress", cascade="all, delete-orphan")
     
+    # Composite indexes backing keyset pagination on /api/products
+    __table_args__ = (
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_price_per_day_id", "price_per_day", "id"),
+        Index("ix_products_average_rating_id", "average_rating", "id"),
+        Index("ix_products_owner_id", "owner_id"),  # owner dashboards
+    )
+    
     @property
     def primary_image(self):
         """Get the primary image URL or first image"""
@@ -111,13 +136,20 @@ class Booking(Base):
     security_deposit = Column(Float)
     status = Column(String, default="pending")
     is_owner_block = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     dress = relationship("Product", back_populates="bookings")
     renter = relationship("User")
     review = relationship("Review", back_populates="booking", uselist=False)
     messages = relationship("Message", back_populates="booking")
+    
+    # Serves date-overlap lookups per dress (conflict checks, availability search)
+    __table_args__ = (
+        Index("ix_bookings_dress_status_dates", "dress_id", "status", "start_date", "end_date"),
+        Index("ix_bookings_updated_at", "updated_at"),  # incremental analytics rollup
+        Index("ix_bookings_created_at_id", "created_at", "id"),  # owner bookings keyset
+    )
 
 
 class Review(Base):
@@ -217,6 +249,55 @@ class DressRequest(Base):
     user = relationship("User", back_populates="dress_requests")
 
 
+class RequestMatchTerm(Base):
+    """Inverted index of pending DressRequests by dress_type token (see utils/matching.py)"""
+    __tablename__ = "request_match_terms"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(Integer, ForeignKey("dress_requests.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    term = Column(String(50), nullable=False)
+    size = Column(String(20), nullable=False)  # normalized size, "*" when the request accepts any
+    budget_max = Column(Float, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_request_match_terms_lookup", "term", "size", "budget_max"),
+    )
+
+
+class OwnerInventory(Base):
+    """Per-owner summary of available listings: one row per (token, size) with its price range"""
+    __tablename__ = "owner_inventory"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    term = Column(String(100), nullable=False)
+    size = Column(String(20), nullable=False)  # "*" = listed without a size
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    product_count = Column(Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_owner_inventory_lookup", "term", "size", "min_price", "max_price", "owner_id"),
+    )
+
+
+class RequestMatch(Base):
+    """Materialized, ranked catalog matches of a DressRequest (see utils/matching.py)"""
+    __tablename__ = "request_matches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(Integer, ForeignKey("dress_requests.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("request_id", "product_id", name="uq_request_matches_request_product"),
+        Index("ix_request_matches_request_score", "request_id", "score", "product_id"),
+    )
+
+
 class Request(Base):
     """Model for customer dress requests (alternative/legacy)"""
     __tablename__ = "requests"
@@ -254,4 +335,132 @@ class Notification(Base):
     created_at = Column(DateTime, default=func.now(), nullable=False)
     # Relationships
     user = relationship("User", back_populates="notifications")
-    request = relationship("DressRequest", foreign_keys=[request_id])
\ No newline at end of file
+    request = relationship("DressRequest", foreign_keys=[request_id])
+
+class CacheVersion(Base):
+    """Shared version counters used to invalidate per-worker caches"""
+    __tablename__ = "cache_versions"
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """Stored result of a POST made with an Idempotency-Key header (see utils/idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    route = Column(String(100), nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String(20), default="in_progress", nullable=False)  # in_progress, done
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "route", "key", name="uq_idempotency_keys_user_route_key"),
+    )
+
+
+class OutboxEvent(Base):
+    """Work committed together with a write and processed later (see utils/outbox.py)"""
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=True)  # JSON
+    status = Column(String(20), default="pending", nullable=False)  # pending, processing, done, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = Column(String(32), nullable=True, index=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_outbox_events_status_available", "status", "available_at"),
+        Index("ix_outbox_events_kind_entity", "kind", "entity_id"),
+    )
+
+
+class DateHold(Base):
+    """Short reservation of a dress's dates while they sit in a cart (see utils/holds.py)"""
+    __tablename__ = "date_holds"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(Integer, ForeignKey("cart.id"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    dress_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        Index("ix_date_holds_dress_dates", "dress_id", "start_date", "end_date", "expires_at"),
+    )
+
+
+class SchedulerLease(Base):
+    """Which worker runs a scheduled job, and until when (see utils/scheduler.py)"""
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    locked_until = Column(DateTime, nullable=False)
+    last_run_at = Column(DateTime, nullable=True)
+    last_result = Column(Text, nullable=True)  # JSON
+
+
+class OwnerBookingStat(Base):
+    """Bookings and revenue per dress, start month and status (see utils/booking_stats.py)"""
+    __tablename__ = "owner_booking_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    dress_id = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)
+    booking_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("dress_id", "year", "month", "status", name="uq_owner_booking_stats_bucket"),
+        Index("ix_owner_booking_stats_owner_status", "owner_id", "status"),
+    )
+
+
+class DressAnalytics(Base):
+    """Rentals, booked days, revenue and lead time per dress and month (see utils/analytics.py)"""
+    __tablename__ = "dress_analytics"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dress_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    bookings = Column(Integer, nullable=False, default=0)  # by start month
+    booked_days = Column(Integer, nullable=False, default=0)  # days of the month the dress was out
+    revenue = Column(Float, nullable=False, default=0)  # by start month
+    lead_days_total = Column(Integer, nullable=False, default=0)  # booking made -> start, summed
+    
+    __table_args__ = (
+        UniqueConstraint("dress_id", "year", "month", name="uq_dress_analytics_dress_month"),
+        Index("ix_dress_analytics_owner_month", "owner_id", "year", "month"),
+    )
+
+
+class RollupWatermark(Base):
+    """How far an incremental rollup job has processed its source table"""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(100), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from sqlalchemy.exc import IntegrityError, OperationalError
+from typing import List, Optional
 from datetime import datetime, date
 from jose import JWTError, jwt
 from ..database import get_db
-from ..models import Booking, User, Product, DressRequest
+from ..models import Booking, User, Product, DressRequest, BLOCKING_BOOKING_STATUSES, BOOKING_STATUS_TRANSITIONS
+from ..schemas import AvailabilityRequest
 from ..utils.security import SECRET_KEY, ALGORITHM
+from ..utils.cache import response_cache, catalog_cache_key
+from ..utils.idempotency import idempotent
+from ..utils.availability import (
+    find_conflict, bump_booking_version, lock_dress_calendar, booking_write_error,
+    bookings_for_dresses, next_free_start, calendar_months, runs_to_bitmap,
+    booked_intervals, suggest_windows, booking_version_name
+)
+from ..utils.holds import find_hold, held_intervals
+from ..utils.booking_stats import refresh_booking_stats, owner_summary
+from ..utils.analytics import owner_analytics
+from ..utils.pagination import encode_cursor, decode_cursor, apply_keyset, InvalidCursor
+from ..utils.matching import request_matches_dress, unindex_request, delete_request_matches
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -36,36 +51,25 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 def check_date_conflict(db: Session, dress_id: int, start_date: date, end_date: date, exclude_booking_id: int = None):
     """Check if the requested dates conflict with existing bookings"""
     
-    query = db.query(Booking).filter(
-        Booking.dress_id == dress_id,
-        Booking.status.in_(["pending", "confirmed", "active"])  # Only check non-cancelled bookings
-    )
-    
-    # Exclude current booking if updating
-    if exclude_booking_id:
-        query = query.filter(Booking.id != exclude_booking_id)
-    
-    existing_bookings = query.all()
-    
-    for booking in existing_bookings:
-        # Check for date overlap
-        # Overlap occurs if: start_date < booking.end_date AND end_date > booking.start_date
-        if start_date < booking.end_date and end_date > booking.start_date:
-            return True, booking  # Conflict found
-    
-    return False, None  # No conflict
+    # Overlap is checked in SQL on the (dress_id, status, start_date, end_date) index
+    conflicting_booking = find_conflict(db, dress_id, start_date, end_date, exclude_booking_id)
+    return conflicting_booking is not None, conflicting_booking
 
 
 @router.get("/product/{product_id}")
 async def get_product_bookings(product_id: int, db: Session = Depends(get_db)):
     """Get all bookings for a specific product (for calendar display)"""
+    cache_key = catalog_cache_key(db, "product_bookings", versions=[booking_version_name(product_id)], product_id=product_id)
+    found, result = response_cache.get(cache_key)
+    if found:
+        return result
     
     bookings = db.query(Booking).filter(
         Booking.dress_id == product_id,
-        Booking.status.in_(["pending", "confirmed", "active"])  # Only show active bookings
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES)  # Only show active bookings
     ).all()
     
-    return [
+    result = [
         {
             "id": booking.id,
             "start_date": booking.start_date.isoformat(),
@@ -74,6 +78,131 @@ async def get_product_bookings(product_id: int, db: Session = Depends(get_db)):
         }
         for booking in bookings
     ]
+    response_cache.set(cache_key, result)
+    return result
+
+
+@router.get("/product/{product_id}/calendar")
+async def get_product_calendar(
+    product_id: int,
+    start: str = Query(None, pattern=r"^\d{4}-\d{2}$", description="First month, YYYY-MM (default: this month)"),
+    months: int = Query(1, ge=1, le=12),
+    format: str = Query("rle", pattern="^(rle|bitmap)$"),
+    db: Session = Depends(get_db)
+):
+    """Booked days per month as [first_day, length] runs or a base64 day bitmap"""
+    if start:
+        year, month = int(start[:4]), int(start[5:])
+        if not 1 <= month <= 12:
+            raise HTTPException(status_code=400, detail="Invalid month")
+    else:
+        today = date.today()
+        year, month = today.year, today.month
+
+    # Each month is read up to the first day of the next one, which must still be a valid date
+    last_month = year * 12 + month - 1 + months - 1
+    if year < date.min.year or last_month >= date.max.year * 12 + 11:
+        raise HTTPException(status_code=400, detail="Calendar range out of bounds")
+
+    result = []
+    for y, m, days, runs in calendar_months(db, product_id, year, month, months):
+        entry = {"month": f"{y:04d}-{m:02d}", "days": days}
+        if format == "bitmap":
+            entry["bitmap"] = runs_to_bitmap(runs, days)
+        else:
+            entry["busy"] = runs
+        result.append(entry)
+    
+    return {"dress_id": product_id, "format": format, "months": result}
+
+
+@router.get("/product/{product_id}/suggest")
+async def suggest_booking_dates(
+    product_id: int,
+    start_date: date,
+    end_date: date,
+    k: int = Query(3, ge=1, le=10),
+    db: Session = Depends(get_db)
+):
+    """Nearest free windows of the same length before and after the requested dates"""
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="End date must be after start date")
+    
+    return booking_suggestions(db, product_id, start_date, end_date, k)
+
+
+def booking_suggestions(db: Session, dress_id: int, start_date: date, end_date: date, k: int = 3, renter_id: int = None):
+    """Free/busy flag plus suggested windows, from one query over the dress's bookings.
+    
+    With renter_id, other renters' cart holds count as busy too.
+    """
+    today = date.today()
+    intervals = booked_intervals(db, dress_id, min(today, start_date))
+    if renter_id:
+        intervals = sorted(intervals + held_intervals(db, dress_id, min(today, start_date), exclude_user_id=renter_id))
+    # One extra window after, in case the first is the requested range itself
+    before, after = suggest_windows(intervals, start_date, end_date, k + 1, earliest=today)
+    free = bool(after) and after[0][0] == start_date
+    before, after = before[:k], [w for w in after if w[0] != start_date][:k]
+    
+    def window(start, end):
+        return {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "shift_days": (start - start_date).days
+        }
+    
+    return {
+        "dress_id": dress_id,
+        "requested": {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+        "free": free,
+        "before": [window(start, end) for start, end in before],
+        "after": [window(start, end) for start, end in after],
+    }
+
+
+@router.post("/availability")
+async def check_availability(payload: AvailabilityRequest, db: Session = Depends(get_db)):
+    """Free/busy flags and the next free window for many dresses and date ranges at once"""
+    for date_range in payload.ranges:
+        if date_range.end_date <= date_range.start_date:
+            raise HTTPException(status_code=400, detail="End date must be after start date")
+    
+    dress_ids = list(dict.fromkeys(payload.dress_ids))
+    if not dress_ids:
+        return {"results": [], "not_found": []}
+    
+    # Bookings of every dress in one query, anything ending before the earliest range is irrelevant
+    listed, booked = bookings_for_dresses(db, dress_ids, min(r.start_date for r in payload.ranges))
+    
+    results = []
+    for dress_id in dress_ids:
+        if dress_id not in listed:
+            continue
+        intervals = booked[dress_id]
+        ranges = []
+        for date_range in payload.ranges:
+            free_from = next_free_start(intervals, date_range.start_date, date_range.end_date)
+            ranges.append({
+                "start_date": date_range.start_date.isoformat(),
+                "end_date": date_range.end_date.isoformat(),
+                "free": listed[dress_id] and free_from == date_range.start_date,
+                "next_free": {
+                    "start_date": free_from.isoformat(),
+                    "end_date": (free_from + (date_range.end_date - date_range.start_date)).isoformat()
+                } if listed[dress_id] else None
+            })
+        results.append({
+            "dress_id": dress_id,
+            "is_available": listed[dress_id],
+            "free": all(r["free"] for r in ranges),
+            "ranges": ranges
+        })
+    
+    return {
+        "results": results,
+        "not_found": [dress_id for dress_id in dress_ids if dress_id not in listed]
+    }
 
 
 @router.get("/")
@@ -133,24 +262,56 @@ async def get_my_bookings(
 
 @router.get("/owner")
 async def get_owner_bookings(
+    response: Response,
+    statuses: Optional[str] = Query(None, alias="status", description="Comma separated statuses"),
+    dress_id: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all bookings for dresses owned by current user (MY ORDERS)"""
+    """Bookings for dresses owned by current user (MY ORDERS), newest first.
+    
+    Filter by status (comma-separated), dress_id and bookings overlapping
+    [from_date, to_date). Pass the X-Next-Cursor response header back as
+    `cursor` to fetch the next page.
+    """
     
     print("\n" + "="*60)
     print("📋 GET OWNER BOOKINGS (MY ORDERS)")
     print("="*60)
     print(f"Owner: {current_user.username} (ID: {current_user.id})")
     
-    bookings = db.query(Booking).join(Product).filter(
+    query = db.query(Booking).join(Product, Product.id == Booking.dress_id).filter(
         Product.owner_id == current_user.id
     ).options(
         joinedload(Booking.dress),
         joinedload(Booking.renter)
-    ).order_by(Booking.created_at.desc()).all()
-    
-    print(f"Found {len(bookings)} bookings for owner's dresses")
+    )
+    if statuses:
+        query = query.filter(Booking.status.in_([s.strip() for s in statuses.split(",") if s.strip()]))
+    if dress_id:
+        query = query.filter(Booking.dress_id == dress_id)
+    if from_date:
+        query = query.filter(Booking.end_date > from_date)
+    if to_date:
+        query = query.filter(Booking.start_date < to_date)
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, "created")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    bookings = apply_keyset(query, Booking.created_at, Booking.id, True, after).limit(limit + 1).all()
+    
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor("created", bookings[-1].created_at, bookings[-1].id)
+    
+    print(f"Returning {len(bookings)} bookings for owner's dresses")
     print("="*60 + "\n")
     
     result = []
@@ -179,13 +340,36 @@ async def get_owner_bookings(
         result.append(booking_dict)
     
     return result
+
+
+@router.get("/owner/summary")
+async def get_owner_booking_summary(
+    months: int = Query(12, ge=1, le=36),
+    upcoming_days: int = Query(14, ge=1, le=90),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Dashboard numbers for the current owner: totals per status, earnings per month and per dress, upcoming pickups"""
+    return owner_summary(db, current_user.id, date.today(), months=months, upcoming_days=upcoming_days)
+
+
+@router.get("/owner/analytics")
+async def get_owner_analytics(
+    months: int = Query(6, ge=1, le=24),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Occupancy, booked days, revenue and lead time per dress of the current owner (refreshed daily)"""
+    return owner_analytics(db, current_user.id, date.today(), months=months)
 from ..models import Booking, User, Product, DressRequest, RequestStatus
 
 @router.post("/")
+@idempotent("POST /api/bookings")
 async def create_booking(
     dress_id: int,
     start_date: date,
     end_date: date,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -211,16 +395,6 @@ async def create_booking(
     if end_date <= start_date:
         raise HTTPException(status_code=400, detail="End date must be after start date")
     
-    # Check for date conflicts
-    has_conflict, conflicting_booking = check_date_conflict(db, dress_id, start_date, end_date)
-    if has_conflict:
-        conflict_start = conflicting_booking.start_date.strftime("%Y-%m-%d")
-        conflict_end = conflicting_booking.end_date.strftime("%Y-%m-%d")
-        raise HTTPException(
-            status_code=400, 
-            detail=f"These dates conflict with an existing booking ({conflict_start} to {conflict_end}). Please choose different dates."
-        )
-    
     # Calculate total days
     total_days = (end_date - start_date).days + 1
     if total_days <= 0:
@@ -229,20 +403,60 @@ async def create_booking(
     # Calculate price
     total_price = dress.price_per_day * total_days
     
-    # Create booking
-    booking = Booking(
-        dress_id=dress_id,
-        renter_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        total_days=total_days,
-        total_price=total_price,
-        security_deposit=dress.security_deposit or 0,
-        status="pending"
-    )
-    
-    db.add(booking)
-    db.commit()
+    try:
+        # Lock this dress's calendar first so no other worker can book it between
+        # the conflict check and the insert (other dresses are not blocked)
+        lock_dress_calendar(db, dress_id)
+        
+        # Check for date conflicts
+        has_conflict, conflicting_booking = check_date_conflict(db, dress_id, start_date, end_date)
+        if has_conflict:
+            db.rollback()
+            conflict_start = conflicting_booking.start_date.strftime("%Y-%m-%d")
+            conflict_end = conflicting_booking.end_date.strftime("%Y-%m-%d")
+            # Offer the closest free dates so the renter doesn't have to probe for them
+            suggestions = booking_suggestions(db, dress_id, start_date, end_date, renter_id=current_user.id)
+            return JSONResponse(status_code=409, content={
+                "detail": f"These dates conflict with an existing booking ({conflict_start} to {conflict_end}). Please choose different dates.",
+                "conflict": {"start_date": conflict_start, "end_date": conflict_end},
+                "suggestions": {"before": suggestions["before"], "after": suggestions["after"]}
+            })
+        
+        # Dates sitting in another renter's cart are reserved until the hold expires
+        hold = find_hold(db, dress_id, start_date, end_date, exclude_user_id=current_user.id)
+        if hold:
+            db.rollback()
+            hold_start = hold.start_date.strftime("%Y-%m-%d")
+            hold_end = hold.end_date.strftime("%Y-%m-%d")
+            suggestions = booking_suggestions(db, dress_id, start_date, end_date, renter_id=current_user.id)
+            return JSONResponse(status_code=409, content={
+                "detail": f"These dates are reserved in another renter's cart ({hold_start} to {hold_end}). Please choose different dates or try again later.",
+                "conflict": {"start_date": hold_start, "end_date": hold_end, "held_until": hold.expires_at.isoformat()},
+                "suggestions": {"before": suggestions["before"], "after": suggestions["after"]}
+            })
+        
+        # Create booking
+        booking = Booking(
+            dress_id=dress_id,
+            renter_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            total_days=total_days,
+            total_price=total_price,
+            security_deposit=dress.security_deposit or 0,
+            status="pending"
+        )
+        
+        db.add(booking)
+        refresh_booking_stats(db, [dress_id])
+        db.commit()
+    except (IntegrityError, OperationalError) as e:
+        db.rollback()
+        error = booking_write_error(e, "This dress was just booked for overlapping dates. Please refresh and choose different dates.")
+        if error is None:
+            raise
+        print(f"⚠️ Booking contention on dress #{dress_id}: {e}")
+        raise error
     db.refresh(booking)
     
     
@@ -264,42 +478,10 @@ async def create_booking(
         
         deleted_count = 0
         for request in all_requests:
-            should_delete = False
-            
-            # Match by dress type/category
-            if request.dress_type:
-                dress_type_lower = request.dress_type.lower()
-                dress_name_lower = dress.name.lower()
-                dress_category_lower = (dress.category or "").lower()
-                
-                if (dress_type_lower in dress_name_lower or 
-                    dress_name_lower in dress_type_lower or
-                    dress_type_lower in dress_category_lower or
-                    dress_category_lower in dress_type_lower):
-                    should_delete = True
-                    print(f"   ✓ Request #{request.id} matches: '{request.dress_type}' ≈ '{dress.name}'")
-            
-            if should_delete:
-                # Check size if specified
-                if request.size and dress.size:
-                    if request.size.upper() != dress.size.upper():
-                        should_delete = False
-                        print(f"   ✗ Size mismatch: {request.size} != {dress.size}")
-                
-                # Check color if specified (DressRequest uses 'color' not 'color_preference')
-                if should_delete and request.color and dress.color:
-                    if request.color.lower() not in dress.color.lower():
-                        should_delete = False
-                        print(f"   ✗ Color mismatch: {request.color} not in {dress.color}")
-                
-                # Check budget if specified
-                if should_delete and request.budget_max:
-                    if dress.price_per_day > request.budget_max:
-                        should_delete = False
-                        print(f"   ✗ Price too high: ₹{dress.price_per_day} > ₹{request.budget_max}")
-            
-            if should_delete:
+            if request_matches_dress(request, dress):
                 print(f"   🗑️ DELETING Request #{request.id}: {request.dress_type}")
+                unindex_request(db, request.id)
+                delete_request_matches(db, request.id)
                 db.delete(request)
                 deleted_count += 1
         
@@ -395,8 +577,41 @@ async def update_booking_status(
     if new_status not in ["pending", "confirmed", "active", "completed", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    booking.status = new_status
-    db.commit()
+    try:
+        # Lock the dress's calendar, then re-read the booking so the checks see its current state
+        lock_dress_calendar(db, booking.dress_id)
+        db.refresh(booking)
+        
+        if new_status == booking.status:
+            db.rollback()
+            return {"message": "Booking status updated", "status": new_status}
+        if new_status not in BOOKING_STATUS_TRANSITIONS.get(booking.status, []):
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Cannot change a {booking.status} booking to {new_status}")
+        
+        # Reinstating a cancelled or expired booking takes its dates again, which may be gone by now
+        if booking.status not in BLOCKING_BOOKING_STATUSES and new_status in BLOCKING_BOOKING_STATUSES:
+            conflict = find_conflict(db, booking.dress_id, booking.start_date, booking.end_date, exclude_booking_id=booking.id)
+            if conflict:
+                db.rollback()
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"These dates now overlap another booking ({conflict.start_date.isoformat()} to {conflict.end_date.isoformat()})"
+                )
+            hold = find_hold(db, booking.dress_id, booking.start_date, booking.end_date, exclude_user_id=booking.renter_id)
+            if hold:
+                db.rollback()
+                raise HTTPException(status_code=409, detail="These dates are reserved in another renter's cart")
+        
+        booking.status = new_status
+        refresh_booking_stats(db, [booking.dress_id])
+        db.commit()
+    except (IntegrityError, OperationalError) as e:
+        db.rollback()
+        error = booking_write_error(e, "These dates were just booked by someone else")
+        if error is None:
+            raise
+        raise error
     
     return {"message": "Booking status updated", "status": new_status}
 
@@ -423,6 +638,8 @@ async def cancel_booking(
         raise HTTPException(status_code=400, detail="Cannot cancel confirmed bookings")
     
     booking.status = "cancelled"
+    bump_booking_version(db, booking.dress_id)
+    refresh_booking_stats(db, [booking.dress_id])
     db.commit()
     
     return {"message": "Booking cancelled"}
\ No newline at end of file
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import OperationalError
 from typing import List
 from ..database import get_db
 from ..models import Cart, Product, User
 from ..schemas import CartItemCreate, CartItemResponse
 from ..auth import get_current_active_user
+from ..utils.availability import find_conflict, lock_dress_calendar, booking_write_error
+from ..utils.holds import find_hold, place_hold, release_holds
 
 router = APIRouter()
 
@@ -48,6 +51,30 @@ async def add_to_cart(
     days = (item.rental_end_date - item.rental_start_date).days
     print(f"Rental days: {days}")
     
+    # Lock the dress's calendar so the dates can't be booked or held between the check and the hold
+    try:
+        lock_dress_calendar(db, item.product_id)
+    except OperationalError as e:
+        db.rollback()
+        error = booking_write_error(e, "This dress was just booked for these dates")
+        if error is None:
+            raise
+        raise error
+    
+    if find_conflict(db, item.product_id, item.rental_start_date, item.rental_end_date):
+        db.rollback()
+        print("❌ Dates already booked")
+        raise HTTPException(status_code=409, detail="This dress is already booked for these dates")
+    
+    hold = find_hold(db, item.product_id, item.rental_start_date, item.rental_end_date, exclude_user_id=current_user.id)
+    if hold:
+        db.rollback()
+        print(f"❌ Dates held by another cart until {hold.expires_at}")
+        raise HTTPException(
+            status_code=409,
+            detail="These dates are reserved in another renter's cart. Please try again later or choose different dates."
+        )
+    
     # Check if already in cart
     existing = db.query(Cart).filter(
         Cart.user_id == current_user.id,
@@ -59,6 +86,7 @@ async def add_to_cart(
         existing.rental_days = days
         existing.start_date = item.rental_start_date
         existing.end_date = item.rental_end_date
+        place_hold(db, existing)
         db.commit()
         db.refresh(existing)
         print("✅ Cart updated successfully")
@@ -74,6 +102,8 @@ async def add_to_cart(
         end_date=item.rental_end_date  # Changed from rental_end_date
     )
     db.add(cart_item)
+    db.flush()
+    place_hold(db, cart_item)
     db.commit()
     db.refresh(cart_item)
     print("✅ Added to cart successfully")
@@ -95,6 +125,7 @@ async def remove_from_cart(
     if not cart_item:
         raise HTTPException(status_code=404, detail="Item not found")
     
+    release_holds(db, current_user.id, [cart_item.id])
     db.delete(cart_item)
     db.commit()
     return {"message": "Removed from cart"}
@@ -105,6 +136,7 @@ async def clear_cart(
     current_user: User = Depends(get_current_active_user)
 ):
     """Clear cart"""
+    release_holds(db, current_user.id)
     db.query(Cart).filter(Cart.user_id == current_user.id).delete()
     db.commit()
     return {"message": "Cart cleared"}
\ No newline at end of file
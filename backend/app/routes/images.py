@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 import shutil
@@ -8,6 +8,7 @@ from ..database import get_db
 from ..models import ProductImage, Product, User
 from ..schemas import ProductImageCreate, ProductImageResponse
 from ..auth import get_current_active_user
+from ..utils.cache import response_cache, catalog_cache_key, bump_catalog_version, check_etag
 
 router = APIRouter()
 
@@ -61,6 +62,7 @@ async def upload_product_image(
         is_primary=is_primary
     )
     db.add(image)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(image)
     
@@ -99,6 +101,7 @@ async def add_product_image(
         is_primary=image.is_primary
     )
     db.add(db_image)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_image)
     return db_image
@@ -106,10 +109,23 @@ async def add_product_image(
 @router.get("/{product_id}", response_model=List[ProductImageResponse])
 async def get_product_images(
     product_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """Get all images for a product"""
+    cache_key = catalog_cache_key(db, "product_images", product_id=product_id)
+    not_modified = check_etag(request, response, cache_key)
+    if not_modified:
+        return not_modified
+    
+    found, images = response_cache.get(cache_key)
+    if found:
+        return images
+    
     images = db.query(ProductImage).filter(ProductImage.product_id == product_id).all()
+    images = [ProductImageResponse.model_validate(image) for image in images]
+    response_cache.set(cache_key, images)
     return images
 
 @router.delete("/{image_id}")
@@ -132,6 +148,7 @@ async def delete_product_image(
         os.remove(image.image_url.lstrip("/"))
     
     db.delete(image)
+    bump_catalog_version(db)
     db.commit()
     return {"message": "Image deleted"}
 
@@ -157,5 +174,6 @@ async def set_primary_image(
     ).update({"is_primary": False})
     
     image.is_primary = True
+    bump_catalog_version(db)
     db.commit()
     return {"message": "Primary image updated"}
\ No newline at end of file
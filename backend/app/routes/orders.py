@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from sqlalchemy.exc import IntegrityError, OperationalError
+from typing import List, Optional
 from datetime import datetime
 from ..database import get_db
 from ..models import Order, OrderItem, Cart, Product, User, Booking
 from ..schemas import OrderCreate, OrderResponse
 from ..auth import get_current_active_user
+from ..utils.idempotency import idempotent
+from ..utils.availability import find_conflicts, lock_dress_calendars, booking_write_error
+from ..utils.holds import find_holds, release_holds
+from ..utils.booking_stats import refresh_booking_stats
 
 router = APIRouter()
 
+OVERLAP_DETAIL = "A dress in your cart was just booked for overlapping dates. Please review your cart."
+
 @router.get("", response_model=List[OrderResponse])
 async def get_orders(
     db: Session = Depends(get_db),
@@ -38,7 +45,12 @@ async def get_orders(
     return orders
 
 @router.post("", response_model=OrderResponse)
+# The request has no parameters, "check out my cart" is all of it; the key
+# names one checkout attempt, so a retry returns that attempt's order even if
+# the cart has changed since (see utils/idempotency.py)
+@idempotent("POST /api/orders", response_model=OrderResponse)
 async def create_order(
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -47,43 +59,58 @@ async def create_order(
     print("📦 CREATE ORDER")
     print("="*60)
     
-    # Get cart items
-    cart_items = db.query(Cart).filter(Cart.user_id == current_user.id).all()
+    # Get cart items with their products in one query
+    cart_items = db.query(Cart).options(joinedload(Cart.product)).filter(
+        Cart.user_id == current_user.id
+    ).all()
     
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
     print(f"Processing {len(cart_items)} cart items")
     
-    # Calculate total and validate availability
-    total_amount = 0
-    order_data = []
-    
+    # Lock the calendars of every dress in the cart before checking them for conflicts
+    try:
+        lock_dress_calendars(db, [item.product_id for item in cart_items])
+    except OperationalError as e:
+        db.rollback()
+        error = booking_write_error(e, OVERLAP_DETAIL)
+        if error is None:
+            raise
+        raise error
+    
+    # Check if products are available
     for item in cart_items:
-        product = item.product
-        
-        # Check if product is available
-        if not product.is_available:
+        if not item.product.is_available:
             raise HTTPException(
                 status_code=400, 
-                detail=f"{product.name} is not available"
+                detail=f"{item.product.name} is not available"
             )
-        
-        # Check for booking conflicts (optional but recommended)
-        conflicting_bookings = db.query(Booking).filter(
-            Booking.dress_id == product.id,
-            Booking.status.in_(["pending", "confirmed"]),
-            Booking.start_date < item.end_date,
-            Booking.end_date > item.start_date
-        ).first()
-        
-        if conflicting_bookings:
+    
+    # Check every (dress, dates) pair for booking conflicts in one query
+    conflicts = find_conflicts(db, [(item.product_id, item.start_date, item.end_date) for item in cart_items])
+    for item in cart_items:
+        if (item.product_id, item.start_date, item.end_date) in conflicts:
             raise HTTPException(
-                status_code=400,
-                detail=f"{product.name} is already booked for these dates"
+                status_code=409,
+                detail=f"{item.product.name} is already booked for these dates"
             )
-        
-        # Calculate price
+    
+    # Dates whose hold lapsed may have been taken into another renter's cart since
+    held = find_holds(db, [(item.product_id, item.start_date, item.end_date) for item in cart_items], current_user.id)
+    for item in cart_items:
+        if (item.product_id, item.start_date, item.end_date) in held:
+            raise HTTPException(
+                status_code=409,
+                detail=f"{item.product.name} is reserved in another renter's cart for these dates"
+            )
+    
+    # Calculate total
+    total_amount = 0
+    order_data = []
+    
+    for item in cart_items:
+        product = item.product
         rental_days = item.rental_days
         item_total = product.price_per_day * rental_days
         total_amount += item_total
@@ -110,35 +137,45 @@ async def create_order(
     db.add(order)
     db.flush()  # Get order ID without committing
     
-    # Create order items and bookings
-    for data in order_data:
-        # Create order item
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=data["product"].id,
-            rental_days=data["rental_days"],
-            price_per_day=data["price_per_day"],
-            total_price=data["total_price"]
-        )
-        db.add(order_item)
-        
-        # Create booking
-        booking = Booking(
-            dress_id=data["product"].id,
-            renter_id=current_user.id,
-            start_date=data["start_date"],
-            end_date=data["end_date"],
-            total_days=data["rental_days"],
-            total_price=data["total_price"],
-            security_deposit=data["product"].security_deposit,
-            status="pending"
-        )
-        db.add(booking)
-    
-    # Clear cart
+    # Create order items and bookings, one bulk insert each
+    db.bulk_insert_mappings(OrderItem, [
+        {
+            "order_id": order.id,
+            "product_id": data["product"].id,
+            "rental_days": data["rental_days"],
+            "price_per_day": data["price_per_day"],
+            "total_price": data["total_price"]
+        }
+        for data in order_data
+    ])
+    db.bulk_insert_mappings(Booking, [
+        {
+            "dress_id": data["product"].id,
+            "renter_id": current_user.id,
+            "start_date": data["start_date"],
+            "end_date": data["end_date"],
+            "total_days": data["rental_days"],
+            "total_price": data["total_price"],
+            "security_deposit": data["product"].security_deposit,
+            "status": "pending"
+        }
+        for data in order_data
+    ])
+    
+    refresh_booking_stats(db, [data["product"].id for data in order_data])
+    
+    # Clear cart, its holds become bookings
+    release_holds(db, current_user.id, converted=True)
     db.query(Cart).filter(Cart.user_id == current_user.id).delete()
     
-    db.commit()
+    try:
+        db.commit()
+    except (IntegrityError, OperationalError) as e:
+        db.rollback()
+        error = booking_write_error(e, OVERLAP_DETAIL)
+        if error is None:
+            raise
+        raise error
     
     # Refresh and reload with relationships
     db.refresh(order)
@@ -2,14 +2,25 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
-from ..models import Product, User
-from ..schemas import ProductCreate, ProductUpdate, ProductResponse
+from ..models import Product, User, Booking, Review, BLOCKING_BOOKING_STATUSES
+from ..schemas import ProductCreate, ProductUpdate, ProductResponse, ProductBatchRequest
 from ..auth import get_current_active_user
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from ..utils.search import apply_search, search_terms
+from ..utils.cache import TTLCache, response_cache, catalog_cache_key, bump_catalog_version, check_etag
+from ..utils.matching import (
+    find_matching_requests, refresh_matches_for_product, delete_product_matches, refresh_owner_inventory
+)
+from ..utils.outbox import outbox_handler, enqueue, wake_worker
+from ..utils.pagination import encode_cursor, decode_cursor, apply_keyset, InvalidCursor
+from ..utils.booking_stats import refresh_booking_stats
+from ..utils.availability import booking_version_name, booked_ranges
+from ..utils.analytics import refresh_dress_analytics
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Response, Request
 from pathlib import Path
 import shutil
 import os
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from sqlalchemy import exists, func, case, and_
 
 router = APIRouter()
 
@@ -52,176 +63,494 @@ async def get_my_dresses(
     return result
 
 
+FACET_FIELDS = ["category", "size", "color", "location", "condition"]
+
+# Price per day buckets for the price facet, upper bound exclusive
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 2000), (2000, 5000), (5000, None)]
+
+# Facet counts per filter set, dropped whenever the catalog version moves
+facet_cache = TTLCache(maxsize=512, ttl=float(os.getenv("FACET_CACHE_TTL", "60")))
+
+# Stable sort orders for keyset pagination: name -> (column, descending)
+# The columns are NOT NULL (see database.backfill_sort_columns)
+PRODUCT_SORTS = {
+    "newest": (Product.created_at, True),
+    "price_asc": (Product.price_per_day, False),
+    "price_desc": (Product.price_per_day, True),
+    "rating": (Product.average_rating, True),
+}
+
+
 @router.get("/products", response_model=List[ProductResponse])
 async def get_products(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
     category: Optional[str] = None,
     search: Optional[str] = None,
     size: Optional[str] = None,
+    color: Optional[str] = None,
+    location: Optional[str] = None,
+    condition: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    available_from: Optional[date] = None,
+    available_to: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all dresses with filters and owner information"""
+    """Get all dresses with filters and owner information.
+
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    `skip` is only kept for older clients and is ignored when a cursor is given.
+    `available_from`/`available_to` hide dresses already booked in that range.
+    """
     from sqlalchemy.orm import joinedload
     
+    # Date-filtered results change with any booking of any dress, so they aren't cached
+    # (versioning them would put every booking write back on one shared counter)
+    cacheable = not (available_from or available_to)
+    if cacheable:
+        cache_key = catalog_cache_key(
+            db, "products",
+            skip=skip, limit=limit, category=category, search=search, size=size, color=color,
+            location=location, condition=condition, min_price=min_price, max_price=max_price,
+            sort=sort, cursor=cursor
+        )
+        not_modified = check_etag(request, response, cache_key)
+        if not_modified:
+            return not_modified
+        
+        found, cached = response_cache.get(cache_key)
+        if found:
+            result, next_cursor = cached
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return result
+    
     # Always load the owner relationship
     query = db.query(Product).options(joinedload(Product.owner))
     
-    if category:
-        query = query.filter(Product.category == category)
+    criteria = catalog_filters(category, size, color, location, condition, min_price, max_price)
+    query = query.filter(*criteria.values())
+    query, rank = apply_search_and_dates(query, db, search, available_from, available_to)
     
-    if size:
-        query = query.filter(Product.size == size)
+    # relevance without a search term has nothing to rank by: use the default order
+    if sort is None or (sort == "relevance" and rank is None):
+        sort = "relevance" if rank is not None else "newest"
     
-    if search:
-        query = query.filter(Product.name.contains(search))
-    
-    products = query.offset(skip).limit(limit).all()
+    if sort == "relevance":
+        sort_expr, descending = rank, False
+    elif sort in PRODUCT_SORTS:
+        sort_expr, descending = PRODUCT_SORTS[sort]
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'")
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    query = apply_keyset(query, sort_expr, Product.id, descending, after)
+    query = query.add_columns(sort_expr)
+    if not cursor and skip:
+        query = query.offset(skip)
+    
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    
+    next_cursor = None
+    if limit > 0 and len(rows) > limit:
+        rows = rows[:limit]
+        last_product, last_value = rows[-1]
+        next_cursor = encode_cursor(sort, last_value, last_product.id)
+        response.headers["X-Next-Cursor"] = next_cursor
     
     # Build response with owner info - make sure owner exists
-    result = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "owner_id": product.owner_id,
-            "owner_username": product.owner.username if product.owner else "Unknown",  # This line is critical
-            "name": product.name,
-            "description": product.description,
-            "price_per_day": product.price_per_day,
-            "category": product.category,
-            "size": product.size,
-            "color": product.color,
-            "brand": product.brand,
-            "condition": product.condition,
-            "security_deposit": product.security_deposit,
-            "location": product.location,
-            "image_url": product.image_url,
-            "is_available": product.is_available,
-            "created_at": product.created_at,
-        }
-        result.append(product_dict)
+    result = [product_to_dict(product) for product, _ in rows]
     
+    if cacheable:
+        response_cache.set(cache_key, (result, next_cursor))
     return result
 
-@router.get("/products", response_model=List[ProductResponse])
-async def get_products(
-    skip: int = 0,
-    limit: int = 20,
+
+@router.get("/products/facets")
+async def get_product_facets(
     category: Optional[str] = None,
     search: Optional[str] = None,
     size: Optional[str] = None,
+    color: Optional[str] = None,
+    location: Optional[str] = None,
+    condition: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    available_from: Optional[date] = None,
+    available_to: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all dresses with filters and owner information"""
-    from sqlalchemy.orm import joinedload
+    """Counts per category, size, color, location, condition and price bucket.
+
+    Takes the same filters as GET /products. Each facet ignores its own filter so
+    the UI can still show the other options of the facet the user picked.
+    """
+    # Not cached with a date filter, see get_products
+    cacheable = not (available_from or available_to)
+    if cacheable:
+        cache_key = catalog_cache_key(
+            db, "facets",
+            category=category, size=size, color=color, location=location, condition=condition,
+            min_price=min_price, max_price=max_price,
+            search=" ".join(search_terms(search)) if search else None
+        )
+        found, facets = facet_cache.get(cache_key)
+        if found:
+            return facets
+    
+    criteria = catalog_filters(category, size, color, location, condition, min_price, max_price)
+    
+    def grouped_counts(column, facet_name):
+        query = db.query(column, func.count(Product.id))
+        query = query.filter(*[c for name, c in criteria.items() if name != facet_name])
+        query, _ = apply_search_and_dates(query, db, search, available_from, available_to)
+        return query.group_by(column).all()
+    
+    facets = {}
+    for field in FACET_FIELDS:
+        rows = grouped_counts(getattr(Product, field), field)
+        facets[field] = sorted(
+            [{"value": value, "count": count} for value, count in rows if value],
+            key=lambda f: (-f["count"], f["value"])
+        )
+    
+    # No else: a dress without a price lands in no bucket, as it matches no price filter
+    bucket = case(
+        *[
+            (Product.price_per_day < high if high is not None else Product.price_per_day >= low, i)
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ]
+    ).label("bucket")
+    bucket_counts = dict(grouped_counts(bucket, "price"))
+    facets["price"] = [
+        {"min": low, "max": high, "count": bucket_counts.get(i, 0)}
+        for i, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
+    
+    total_query = db.query(func.count(Product.id)).filter(*criteria.values())
+    total_query, _ = apply_search_and_dates(total_query, db, search, available_from, available_to)
+    facets["total"] = total_query.scalar()
+    
+    if cacheable:
+        facet_cache.set(cache_key, facets)
+    return facets
+
+
+MAX_BATCH_IDS = 500
+
+
+@router.get("/products/batch")
+async def get_products_batch(
+    ids: str = Query(..., description="Comma separated product ids"),
+    db: Session = Depends(get_db)
+):
+    """Fetch many dresses at once, keyed by id"""
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    return load_products_batch(db, product_ids)
+
+
+@router.post("/products/batch")
+async def post_products_batch(
+    batch: ProductBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """Fetch many dresses at once, keyed by id (for id lists too long for a URL)"""
+    return load_products_batch(db, batch.ids)
+
+
+def load_products_batch(db: Session, product_ids):
+    """Load products with owner and images in one IN query plus one for images"""
+    from sqlalchemy.orm import joinedload, selectinload
+    
+    product_ids = list(dict.fromkeys(product_ids))
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    if not product_ids:
+        return {"products": {}, "missing": []}
+    
+    products = db.query(Product).options(
+        joinedload(Product.owner),
+        selectinload(Product.images)
+    ).filter(Product.id.in_(product_ids)).all()
+    
+    found = {}
+    for product in products:
+        product_dict = product_to_dict(product)
+        product_dict["primary_image"] = product.primary_image or product.image_url
+        found[product.id] = product_dict
     
-    query = db.query(Product).options(joinedload(Product.owner))
+    return {
+        "products": found,
+        "missing": [product_id for product_id in product_ids if product_id not in found],
+    }
+
+
+@router.get("/products/{product_id}", response_model=ProductResponse)
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Get a single dress with owner information"""
+    from sqlalchemy.orm import joinedload
     
-    if category:
-        query = query.filter(Product.category == category)
+    cache_key = catalog_cache_key(db, "product", product_id=product_id)
+    not_modified = check_etag(request, response, cache_key)
+    if not_modified:
+        return not_modified
     
-    if size:
-        query = query.filter(Product.size == size)
+    found, product_dict = response_cache.get(cache_key)
+    if found:
+        return product_dict
     
-    if search:
-        query = query.filter(Product.name.contains(search))
+    product = db.query(Product).options(joinedload(Product.owner)).filter(
+        Product.id == product_id
+    ).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Dress not found")
     
-    products = query.offset(skip).limit(limit).all()
+    product_dict = product_to_dict(product)
+    response_cache.set(cache_key, product_dict)
+    return product_dict
+
+
+@router.get("/products/{product_id}/detail")
+async def get_product_detail(
+    product_id: int,
+    request: Request,
+    response: Response,
+    reviews_limit: int = Query(5, ge=0, le=50),
+    days: int = Query(90, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    """Everything the product details page needs in one call.
+
+    Product, owner card, images, rating summary, latest reviews and the booked
+    ranges for the next `days` days, loaded with a fixed number of queries.
+    """
+    from sqlalchemy.orm import joinedload, selectinload
+    
+    window_start = date.today()
+    window_end = window_start + timedelta(days=days)
+    
+    # Booked ranges are versioned per dress, so bookings elsewhere don't evict this
+    cache_key = catalog_cache_key(
+        db, "product_detail", versions=[booking_version_name(product_id)],
+        product_id=product_id, reviews_limit=reviews_limit, days=days, window_start=window_start
+    )
+    not_modified = check_etag(request, response, cache_key)
+    if not_modified:
+        return not_modified
+    
+    found, detail = response_cache.get(cache_key)
+    if found:
+        return detail
+    
+    # Product + owner in one query, images in one more
+    product = db.query(Product).options(
+        joinedload(Product.owner),
+        selectinload(Product.images)
+    ).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Dress not found")
     
-    # Manually build response with owner info
-    result = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "owner_id": product.owner_id,
-            "owner_username": product.owner.username if product.owner else "Unknown",  # This is correct!
-            "name": product.name,
-            "description": product.description,
-            "price_per_day": product.price_per_day,
-            "category": product.category,
-            "size": product.size,
-            "color": product.color,
-            "brand": product.brand,
-            "condition": product.condition,
-            "security_deposit": product.security_deposit,
-            "location": product.location,
-            "image_url": product.image_url,
-            "is_available": product.is_available,
-            "created_at": product.created_at,
-        }
-        result.append(product_dict)
+    total_reviews, average_rating = db.query(
+        func.count(Review.id), func.avg(Review.rating)
+    ).filter(Review.dress_id == product_id).one()
+    
+    reviews = []
+    if reviews_limit:
+        reviews = db.query(Review).options(joinedload(Review.reviewer)).filter(
+            Review.dress_id == product_id
+        ).order_by(Review.created_at.desc()).limit(reviews_limit).all()
+    
+    bookings = booked_ranges(db, product_id, window_start, window_end)
+    
+    owner = product.owner
+    detail = {
+        "product": product_to_dict(product),
+        "owner": {
+            "id": owner.id,
+            "username": owner.username,
+            "full_name": owner.full_name,
+            "profile_image": owner.profile_image,
+            "location": owner.location,
+            "verified": owner.verified,
+            "trust_score": owner.trust_score,
+            "member_since": owner.member_since,
+        } if owner else None,
+        "images": [
+            {
+                "id": image.id,
+                "image_url": image.image_url,
+                "is_primary": image.is_primary,
+                "order": image.order,
+            }
+            for image in sorted(product.images, key=lambda i: (not i.is_primary, i.order or 0, i.id))
+        ],
+        "rating": {
+            "average_rating": round(float(average_rating), 1) if average_rating is not None else 0,
+            "total_reviews": total_reviews,
+        },
+        "reviews": [
+            {
+                "id": review.id,
+                "dress_id": review.dress_id,
+                "booking_id": review.booking_id,
+                "reviewer_id": review.reviewer_id,
+                "rating": review.rating,
+                "comment": review.comment,
+                "owner_response": review.owner_response,
+                "created_at": review.created_at,
+                "reviewer": {
+                    "id": review.reviewer.id,
+                    "username": review.reviewer.username,
+                    "full_name": review.reviewer.full_name,
+                } if review.reviewer else None,
+            }
+            for review in reviews
+        ],
+        "booked_ranges": [
+            {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "status": booking_status,
+            }
+            for start_date, end_date, booking_status, _ in bookings
+        ],
+        "window": {"from": window_start.isoformat(), "to": window_end.isoformat()},
+    }
     
-    return result
-async def notify_matching_requests(db: Session, new_dress):
-    """Find and notify users with matching requests"""
-    from ..models import DressRequest, Notification, RequestStatus
+    response_cache.set(cache_key, detail)
+    return detail
+
+
+def product_to_dict(product):
+    """Shape a Product (with owner loaded) like ProductResponse"""
+    return {
+        "id": product.id,
+        "owner_id": product.owner_id,
+        "owner_username": product.owner.username if product.owner else "Unknown",
+        "name": product.name,
+        "description": product.description,
+        "price_per_day": product.price_per_day,
+        "category": product.category,
+        "size": product.size,
+        "color": product.color,
+        "brand": product.brand,
+        "condition": product.condition,
+        "security_deposit": product.security_deposit,
+        "location": product.location,
+        "image_url": product.image_url,
+        "is_available": product.is_available,
+        "created_at": product.created_at,
+    }
+
+
+def catalog_filters(category=None, size=None, color=None, location=None, condition=None,
+                    min_price=None, max_price=None):
+    """Build the attribute filters of a catalog query, keyed by facet name"""
+    values = {"category": category, "size": size, "color": color, "location": location, "condition": condition}
+    criteria = {
+        field: getattr(Product, field) == value
+        for field, value in values.items() if value
+    }
+    price = []
+    if min_price is not None:
+        price.append(Product.price_per_day >= min_price)
+    if max_price is not None:
+        price.append(Product.price_per_day <= max_price)
+    if price:
+        criteria["price"] = and_(*price)
+    return criteria
+
+
+def apply_search_and_dates(query, db: Session, search=None, available_from=None, available_to=None):
+    """Apply full-text search and the availability window, returns (query, rank)"""
+    if available_from or available_to:
+        if not (available_from and available_to):
+            raise HTTPException(status_code=400, detail="Both available_from and available_to are required")
+        if available_to <= available_from:
+            raise HTTPException(status_code=400, detail="available_to must be after available_from")
+        query = filter_available(query, available_from, available_to)
+    
+    rank = None
+    if search:
+        # Full-text match on name, description, brand, color and category
+        query, rank = apply_search(query, db, search, Product)
+    return query, rank
+
+def filter_available(query, start_date: date, end_date: date):
+    """Anti-join a Product query against overlapping bookings for the given dates"""
+    overlapping = exists().where(
+        Booking.dress_id == Product.id,
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES),
+        Booking.start_date < end_date,
+        Booking.end_date > start_date
+    )
+    return query.filter(Product.is_available == True, ~overlapping)
+
+
+@outbox_handler("product_created")
+def handle_product_created(db: Session, event):
+    """Outbox handler: fan out match notifications for a newly listed dress"""
+    new_dress = db.query(Product).filter(Product.id == event.entity_id).first()
+    if not new_dress or not new_dress.is_available:
+        return  # Deleted or withdrawn before the worker got to it
+    notify_matching_requests(db, new_dress)
+    refresh_matches_for_product(db, new_dress)
+
+
+@outbox_handler("product_changed")
+def handle_product_changed(db: Session, event):
+    """Outbox handler: re-rank the request match lists an edited dress is (or now belongs) on"""
+    dress = db.query(Product).filter(Product.id == event.entity_id).first()
+    if dress:
+        refresh_matches_for_product(db, dress)
+
+
+def notify_matching_requests(db: Session, new_dress):
+    """Find and notify users with matching requests (caller commits)"""
+    from ..models import Notification
     
     print(f"\n🔔 Checking matching requests for: {new_dress.name}")
     
-    # Get all PENDING requests (use DressRequest, not Request!)
-    open_requests = db.query(DressRequest).filter(
-        DressRequest.status == RequestStatus.PENDING  # Use ENUM not string
-    ).all()
+    # Only requests sharing a dress_type token with this dress are loaded
+    matching_requests = find_matching_requests(db, new_dress)
     
     matched_count = 0
-    for request in open_requests:
-        # Skip owner's own requests
-        if request.user_id == new_dress.owner_id:
-            continue
-        
-        # Check if dress matches
-        matches = False
-        
-        # Check dress type/category
-        if request.dress_type:
-            dress_type_lower = request.dress_type.lower()
-            dress_name_lower = new_dress.name.lower()
-            dress_category_lower = (new_dress.category or "").lower()
-            
-            if (dress_type_lower in dress_name_lower or 
-                dress_name_lower in dress_type_lower or
-                dress_type_lower in dress_category_lower or
-                dress_category_lower in dress_type_lower):
-                matches = True
-        
-        # Check size if specified
-        if matches and request.size and new_dress.size:
-            if request.size.upper() == new_dress.size.upper():
-                matches = True
-            else:
-                matches = False
-        
-        # Check color if specified (DressRequest uses 'color' not 'color_preference')
-        if matches and request.color and new_dress.color:
-            if request.color.lower() in new_dress.color.lower():
-                matches = True
-            else:
-                matches = False
-        
-        # Check budget if specified
-        if matches and request.budget_max:
-            if new_dress.price_per_day <= request.budget_max:
-                matches = True
-            else:
-                matches = False
-        
-        if matches:
-            # Create notification
-            notification = Notification(
-                user_id=request.user_id,
-                type="dress_match",
-                title="New Dress Match!",
-                message=f"'{new_dress.name}' matches your '{request.dress_type}' request!",
-                related_id=new_dress.id,
-                request_id=request.id,
-                is_read=False
-            )
-            db.add(notification)
-            matched_count += 1
-            print(f"   ✅ Matched request #{request.id} for user #{request.user_id}")
+    for request in matching_requests:
+        # Create notification
+        notification = Notification(
+            user_id=request.user_id,
+            type="dress_match",
+            title="New Dress Match!",
+            message=f"'{new_dress.name}' matches your '{request.dress_type}' request!",
+            related_id=new_dress.id,
+            request_id=request.id,
+            is_read=False
+        )
+        db.add(notification)
+        matched_count += 1
+        print(f"   ✅ Matched request #{request.id} for user #{request.user_id}")
     
     if matched_count > 0:
-        db.commit()
         print(f"   ✅ Notified {matched_count} users")
     else:
         print(f"   ℹ️ No matching requests found")
@@ -277,11 +606,14 @@ async def create_product(
         image_url=image_url
     )
     db.add(db_product)
+    db.flush()
+    # Match notifications are sent by the outbox worker, committed with the product
+    enqueue(db, "product_created", db_product.id)
+    refresh_owner_inventory(db, current_user.id)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
-    
-    # Notify matching requests
-    await notify_matching_requests(db, db_product)
+    wake_worker()
     
     # Load owner relationship
     db_product = db.query(Product).options(joinedload(Product.owner)).filter(
@@ -380,8 +712,12 @@ async def update_product(
     if is_available is not None:
         db_product.is_available = is_available
     
+    enqueue(db, "product_changed", db_product.id)
+    refresh_owner_inventory(db, current_user.id)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
+    wake_worker()
     return db_product
 
 @router.delete("/products/{product_id}")
@@ -404,12 +740,17 @@ async def delete_product(
         if image_path.exists():
             image_path.unlink()
     
+    delete_product_matches(db, db_product.id)
     db.delete(db_product)
+    refresh_booking_stats(db, [product_id])  # its bookings go with it
+    refresh_dress_analytics(db, [product_id])
+    refresh_owner_inventory(db, current_user.id)
+    bump_catalog_version(db)
     db.commit()
     return {"message": "Dress deleted successfully"}
 # In your products.py or notifications.py router
 
-from ..models import Notification, Request
+from ..models import Notification, Request as CustomerRequest
 
 @router.post("/products/upload-for-request/{request_id}")
 async def upload_matching_dress(
@@ -432,7 +773,7 @@ async def upload_matching_dress(
     from sqlalchemy.orm import joinedload
     
     # Get the request
-    dress_request = db.query(Request).filter(Request.id == request_id).first()
+    dress_request = db.query(CustomerRequest).filter(CustomerRequest.id == request_id).first()
     if not dress_request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -469,8 +810,13 @@ async def upload_matching_dress(
         image_url=image_url
     )
     db.add(db_product)
+    db.flush()
+    enqueue(db, "product_changed", db_product.id)
+    refresh_owner_inventory(db, current_user.id)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
+    wake_worker()
     
     # Create notification for the customer
     notification = Notification(
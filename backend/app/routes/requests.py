@@ -7,6 +7,10 @@ from ..database import get_db
 from ..models import DressRequest, User, Notification, RequestStatus
 from ..schemas import DressRequestCreate, DressRequestResponse, DressRequestUpdate
 from ..utils.security import SECRET_KEY, ALGORITHM
+from ..utils.matching import (
+    index_request, unindex_request, refresh_request_matches, delete_request_matches, notify_matching_owners
+)
+from ..utils.outbox import outbox_handler, enqueue, wake_worker
 from ..models import Booking, User, Product, DressRequest, RequestStatus
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -32,6 +36,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 
 router = APIRouter()
 
+
+@outbox_handler("request_matches")
+def handle_request_matches(db: Session, event):
+    """Outbox handler: compute and store the ranked catalog matches of a request"""
+    db_request = db.query(DressRequest).filter(DressRequest.id == event.entity_id).first()
+    if db_request:
+        refresh_request_matches(db, db_request)
+
+
 @router.post("/", response_model=DressRequestResponse)
 async def create_dress_request(
     request: DressRequestCreate,
@@ -46,22 +59,15 @@ async def create_dress_request(
         **request.dict()
     )
     db.add(db_request)
+    db.flush()
+    index_request(db, db_request)
+    # The match list is filled by the outbox worker, so posting stays cheap
+    enqueue(db, "request_matches", db_request.id)
+    # Only owners whose listings could satisfy the request are told, in one INSERT ... SELECT
+    notify_matching_owners(db, db_request)
     db.commit()
     db.refresh(db_request)
-    
-    # Create notifications for all other users (potential owners)
-    all_users = db.query(User).filter(User.id != current_user.id).all()
-    for user in all_users:
-        notification = Notification(
-            user_id=user.id,
-            type="new_request", 
-            title="New Dress Request",  
-            message=f"New dress request: {request.dress_type}",
-            request_id=db_request.id
-        )
-        db.add(notification)
-    
-    db.commit()
+    wake_worker()
     
     # Add username to response
     response = DressRequestResponse.from_orm(db_request)
@@ -135,8 +141,12 @@ async def update_request(
     for field, value in request_update.dict(exclude_unset=True).items():
         setattr(db_request, field, value)
     
+    # Keep the matching index in step (drops the request once it's no longer pending)
+    index_request(db, db_request)
+    enqueue(db, "request_matches", db_request.id)
     db.commit()
     db.refresh(db_request)
+    wake_worker()
     
     response = DressRequestResponse.from_orm(db_request)
     response.username = current_user.username
@@ -159,6 +169,8 @@ async def delete_request(
     if db_request.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    unindex_request(db, db_request.id)
+    delete_request_matches(db, db_request.id)
     db.delete(db_request)
     db.commit()
     
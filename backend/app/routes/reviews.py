@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from ..models import Review, Product, User, Booking
 from ..schemas import ReviewCreate, ReviewResponse
 from ..auth import get_current_active_user
+from ..utils.cache import response_cache, catalog_cache_key, bump_catalog_version, check_etag
 
 router = APIRouter()
 
@@ -62,13 +63,26 @@ async def create_review(
 @router.get("/product/{product_id}", response_model=List[ReviewResponse])
 async def get_product_reviews(
     product_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """Get all reviews for a product"""
+    cache_key = catalog_cache_key(db, "product_reviews", product_id=product_id)
+    not_modified = check_etag(request, response, cache_key)
+    if not_modified:
+        return not_modified
+    
+    found, reviews = response_cache.get(cache_key)
+    if found:
+        return reviews
+    
     # FIXED: Use dress_id
     reviews = db.query(Review).filter(
         Review.dress_id == product_id
     ).order_by(Review.created_at.desc()).all()
+    reviews = [ReviewResponse.model_validate(review) for review in reviews]
+    response_cache.set(cache_key, reviews)
     return reviews
 
 @router.get("/product/{product_id}/average")
@@ -155,4 +169,6 @@ def update_product_rating(db: Session, product_id: int):
         else:
             product.average_rating = 0.0
         
+        # Last write of every review change, so cached reviews and ratings refresh together
+        bump_catalog_version(db)
         db.commit()
\ No newline at end of file
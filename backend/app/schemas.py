@@ -112,6 +112,9 @@ class ProductUpdate(BaseModel):
     location: Optional[str] = None
     is_available: Optional[bool] = None
 
+class ProductBatchRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=500)
+
 from pydantic import BaseModel, computed_field
 from datetime import datetime
 from typing import Optional
@@ -385,4 +388,12 @@ class Token(BaseModel):
     user: Optional[UserResponse] = None
 
 class TokenData(BaseModel):
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+# Booking availability schemas
+class DateRange(BaseModel):
+    start_date: date
+    end_date: date
+
+class AvailabilityRequest(BaseModel):
+    dress_ids: List[int] = Field(..., max_length=200)
+    ranges: List[DateRange] = Field(..., min_length=1, max_length=20)
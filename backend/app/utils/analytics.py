@@ -0,0 +1,187 @@
+import calendar
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from .scheduler import scheduled_job
+
+# Per-dress utilization analytics.
+# dress_analytics keeps one row per (dress, month): rentals and revenue by
+# start month, days the dress was out (a rental spanning months is split),
+# and summed lead time. The daily job only rebuilds the dresses whose bookings
+# changed since its watermark (bookings.updated_at), so its cost follows the
+# new bookings, not the table size. The watermark is moved back by
+# OVERLAP_MINUTES when read, so a transaction that committed late is still
+# seen; rebuilding a dress twice is harmless.
+#
+# Only rentals count (EARNING_BOOKING_STATUSES). Days are [start_date, end_date)
+# like the availability checks.
+
+EVERY_SECONDS = float(os.getenv("DRESS_ANALYTICS_SECONDS", "86400"))
+OVERLAP_MINUTES = int(os.getenv("DRESS_ANALYTICS_OVERLAP_MINUTES", "10"))
+BATCH_SIZE = int(os.getenv("DRESS_ANALYTICS_BATCH", "200"))
+WATERMARK_NAME = "dress_analytics"
+
+
+def month_slices(start_date, end_date):
+    """(year, month, days) of each month [start_date, end_date) touches"""
+    day = start_date
+    while day < end_date:
+        month_end = date(day.year, day.month, calendar.monthrange(day.year, day.month)[1]) + timedelta(days=1)
+        until = min(month_end, end_date)
+        yield day.year, day.month, (until - day).days
+        day = until
+
+
+def refresh_dress_analytics(db, dress_ids):
+    """Rebuild the analytics rows and total_bookings of some dresses from their bookings (caller commits)"""
+    from ..models import Booking, Product, DressAnalytics, EARNING_BOOKING_STATUSES
+
+    dress_ids = sorted(set(dress_ids))
+    if not dress_ids:
+        return
+    db.flush()
+    owners = dict(db.query(Product.id, Product.owner_id).filter(Product.id.in_(dress_ids)).all())
+    rows = db.query(
+        Booking.dress_id, Booking.start_date, Booking.end_date, Booking.total_price, Booking.created_at
+    ).filter(
+        Booking.dress_id.in_(list(owners)),
+        Booking.status.in_(EARNING_BOOKING_STATUSES),
+        Booking.start_date.isnot(None),
+        Booking.end_date > Booking.start_date
+    ).all()
+
+    buckets = {}
+    for dress_id, start_date, end_date, total_price, created_at in rows:
+        bucket = buckets.setdefault((dress_id, start_date.year, start_date.month), [0, 0, 0.0, 0])
+        bucket[0] += 1
+        bucket[2] += total_price or 0
+        if created_at:
+            bucket[3] += max((start_date - created_at.date()).days, 0)
+        for year, month, days in month_slices(start_date, end_date):
+            buckets.setdefault((dress_id, year, month), [0, 0, 0.0, 0])[1] += days
+
+    db.query(DressAnalytics).filter(DressAnalytics.dress_id.in_(dress_ids)).delete(synchronize_session=False)
+    db.bulk_insert_mappings(DressAnalytics, [
+        {
+            "dress_id": dress_id,
+            "owner_id": owners[dress_id],
+            "year": year,
+            "month": month,
+            "bookings": bookings,
+            "booked_days": booked_days,
+            "revenue": revenue,
+            "lead_days_total": lead_days,
+        }
+        for (dress_id, year, month), (bookings, booked_days, revenue, lead_days) in buckets.items()
+    ])
+
+    # Product.total_bookings: rentals per dress, one correlated UPDATE
+    rentals = select(func.count(Booking.id)).where(
+        Booking.dress_id == Product.id,
+        Booking.status.in_(EARNING_BOOKING_STATUSES)
+    ).scalar_subquery()
+    db.query(Product).filter(Product.id.in_(dress_ids)).update(
+        {Product.total_bookings: rentals}, synchronize_session=False
+    )
+
+
+def get_watermark(db, name: str):
+    from ..models import RollupWatermark
+    row = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    return row.watermark if row else None
+
+
+def set_watermark(db, name: str, watermark):
+    """Record how far a rollup got (caller commits)"""
+    from ..models import RollupWatermark
+    row = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    if row:
+        row.watermark = watermark
+    else:
+        db.add(RollupWatermark(name=name, watermark=watermark))
+
+
+@scheduled_job("dress_analytics", EVERY_SECONDS)
+def update_dress_analytics(db, batch_size: int = BATCH_SIZE):
+    """Rebuild the dresses whose bookings changed since the last run (all dresses on the first run)"""
+    from ..models import Booking
+
+    started = datetime.utcnow()
+    watermark = get_watermark(db, WATERMARK_NAME)
+    changed = db.query(Booking.dress_id).distinct()
+    if watermark is not None:
+        changed = changed.filter(Booking.updated_at > watermark - timedelta(minutes=OVERLAP_MINUTES))
+    dress_ids = sorted(dress_id for (dress_id,) in changed.all() if dress_id is not None)
+
+    for i in range(0, len(dress_ids), batch_size):
+        refresh_dress_analytics(db, dress_ids[i:i + batch_size])
+        db.commit()
+    set_watermark(db, WATERMARK_NAME, started)
+    db.commit()
+
+    if dress_ids:
+        print(f"📊 Dress analytics updated for {len(dress_ids)} dresses")
+    return {"dresses": len(dress_ids), "full": watermark is None}
+
+
+def owner_analytics(db, owner_id: int, today, months: int = 6):
+    """Per-dress utilization over the last `months` months including the current one"""
+    from ..models import Product, DressAnalytics
+
+    stats = DressAnalytics
+    first_month = today.year * 12 + today.month - months + 1
+    last_month = today.year * 12 + today.month
+    month_key = stats.year * 12 + stats.month
+    window = [((key - 1) // 12, (key - 1) % 12 + 1) for key in range(first_month, last_month + 1)]
+    days_by_month = {(year, month): calendar.monthrange(year, month)[1] for year, month in window}
+    window_days = sum(days_by_month.values())
+
+    dresses = db.query(Product.id, Product.name, Product.total_bookings).filter(
+        Product.owner_id == owner_id
+    ).order_by(Product.id).all()
+    rows = db.query(
+        stats.dress_id, stats.year, stats.month, stats.bookings, stats.booked_days, stats.revenue, stats.lead_days_total
+    ).filter(
+        stats.owner_id == owner_id, month_key >= first_month, month_key <= last_month
+    ).all()
+
+    by_dress = {}
+    for dress_id, year, month, bookings, booked_days, revenue, lead_days in rows:
+        by_dress.setdefault(dress_id, {})[(year, month)] = (bookings, booked_days, revenue, lead_days)
+
+    def month_stats(year, month, bookings, booked_days, revenue, lead_days):
+        return {
+            "month": f"{year:04d}-{month:02d}",
+            "bookings": bookings,
+            "booked_days": booked_days,
+            "occupancy": round(booked_days / days_by_month[(year, month)], 3),
+            "revenue": round(revenue, 2),
+        }
+
+    result = []
+    for dress_id, name, total_bookings in dresses:
+        series = by_dress.get(dress_id, {})
+        bookings = sum(v[0] for v in series.values())
+        booked_days = sum(v[1] for v in series.values())
+        lead_days = sum(v[3] for v in series.values())
+        result.append({
+            "dress_id": dress_id,
+            "name": name,
+            "total_bookings": total_bookings or 0,
+            "bookings": bookings,
+            "booked_days": booked_days,
+            "occupancy": round(booked_days / window_days, 3),
+            "revenue": round(sum(v[2] for v in series.values()), 2),
+            "avg_lead_days": round(lead_days / bookings, 1) if bookings else None,
+            "months": [month_stats(year, month, *series.get((year, month), (0, 0, 0.0, 0))) for year, month in window],
+        })
+
+    booked_days = sum(dress["booked_days"] for dress in result)
+    updated_at = get_watermark(db, WATERMARK_NAME)
+    return {
+        "window": {"from": f"{window[0][0]:04d}-{window[0][1]:02d}", "to": f"{today.year:04d}-{today.month:02d}", "days": window_days},
+        "updated_at": updated_at.isoformat() if updated_at else None,
+        "occupancy": round(booked_days / (window_days * len(result)), 3) if result else 0,
+        "revenue": round(sum(dress["revenue"] for dress in result), 2),
+        "dresses": result,
+    }
@@ -0,0 +1,413 @@
+import base64
+import calendar
+import os
+from bisect import bisect_left
+from datetime import date, timedelta
+from sqlalchemy import text
+from .cache import TTLCache, get_version, bump_version, bump_versions
+
+# Availability of dresses.
+# Bookings are half-open ranges [start_date, end_date); two ranges overlap when
+# start < other_end and end > other_start. Both checks run in SQL against
+# ix_bookings_dress_status_dates (dress_id, status, start_date, end_date), so a
+# dress with hundreds of past bookings costs an index seek, not a Python loop.
+#
+# Read paths can also use a per-dress IntervalIndex kept in each worker's
+# memory. It is keyed by a per-dress version counter that every booking write
+# bumps, so a stale index is never used. Write paths always ask the database.
+
+AVAILABILITY_CACHE_ENABLED = os.getenv("AVAILABILITY_CACHE", "1") == "1"
+
+interval_cache = TTLCache(
+    maxsize=int(os.getenv("AVAILABILITY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "300"))
+)
+
+
+# Busy-day runs per (dress, month, booking version), see calendar_months()
+calendar_cache = TTLCache(
+    maxsize=int(os.getenv("CALENDAR_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("CALENDAR_CACHE_TTL", "600"))
+)
+
+
+def booking_version_name(dress_id: int) -> str:
+    return f"bookings:{dress_id}"
+
+
+def bump_booking_version(db, dress_id: int):
+    """Invalidate cached intervals of a dress on every worker once the caller commits"""
+    bump_version(db, booking_version_name(dress_id))
+
+
+def lock_dress_calendar(db, dress_id: int):
+    """Serialize booking writes for one dress until the caller commits or rolls back.
+
+    The per-dress version counter row doubles as the lock: updating it takes a
+    row lock on PostgreSQL (other dresses are unaffected) and the write lock on
+    SQLite, so a conflict check made after this call can't be raced. The update
+    also invalidates the dress's cached intervals, which the write is about to
+    change anyway.
+    """
+    bump_booking_version(db, dress_id)
+
+
+def lock_dress_calendars(db, dress_ids):
+    """lock_dress_calendar for many dresses at once, rows locked in a fixed order so carts can't deadlock"""
+    bump_versions(db, [booking_version_name(dress_id) for dress_id in dress_ids])
+
+
+# Last line of defence on PostgreSQL: two blocking bookings of a dress can never
+# overlap, whatever code path inserts them
+BOOKING_OVERLAP_CONSTRAINT = "bookings_no_overlap"
+
+
+def install_booking_constraints(engine):
+    """Create the booking overlap exclusion constraint on PostgreSQL if missing"""
+    from ..models import BLOCKING_BOOKING_STATUSES
+
+    if engine.dialect.name != "postgresql":
+        return
+    statuses = ", ".join(f"'{status}'" for status in BLOCKING_BOOKING_STATUSES)
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+                {"name": BOOKING_OVERLAP_CONSTRAINT}
+            ).first()
+            if exists:
+                return
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            conn.execute(text(
+                f"ALTER TABLE bookings ADD CONSTRAINT {BOOKING_OVERLAP_CONSTRAINT} "
+                "EXCLUDE USING gist (dress_id WITH =, daterange(start_date, end_date, '[)') WITH &&) "
+                f"WHERE (status IN ({statuses}))"
+            ))
+        print("✅ Booking overlap constraint installed")
+    except Exception as e:
+        # e.g. overlapping bookings already in the table
+        print(f"⚠️ Booking overlap constraint not installed: {e}")
+
+
+# Errors that only mean the calendar lock couldn't be had in time: worth a retry
+LOCK_TIMEOUT_ERRORS = (
+    "database is locked",  # SQLite busy timeout
+    "lock timeout",  # PostgreSQL lock_timeout
+    "deadlock detected",
+    "could not serialize access",
+)
+
+
+def is_booking_contention(error) -> bool:
+    """Whether a failed booking write hit the overlap constraint (the dates were just taken)"""
+    return BOOKING_OVERLAP_CONSTRAINT in str(getattr(error, "orig", error))
+
+
+def is_lock_timeout(error) -> bool:
+    """Whether a failed booking write only timed out waiting for a lock"""
+    message = str(getattr(error, "orig", error))
+    return any(text in message for text in LOCK_TIMEOUT_ERRORS)
+
+
+def booking_write_error(error, overlap_detail: str):
+    """HTTPException to report a failed booking write with, or None if the error is unrelated.
+
+    An overlap is a 409 with overlap_detail; a lock timeout is a 503 the client
+    can simply retry.
+    """
+    from fastapi import HTTPException
+
+    if is_booking_contention(error):
+        return HTTPException(status_code=409, detail=overlap_detail)
+    if is_lock_timeout(error):
+        return HTTPException(
+            status_code=503,
+            detail="The booking calendar is busy right now. Please try again in a moment.",
+            headers={"Retry-After": "1"}
+        )
+    return None
+
+
+def blocking_bookings(db, dress_id: int, exclude_booking_id: int = None):
+    """Query of the bookings that hold a dress (pending, confirmed or active)"""
+    from ..models import Booking, BLOCKING_BOOKING_STATUSES
+
+    query = db.query(Booking).filter(
+        Booking.dress_id == dress_id,
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES)
+    )
+    if exclude_booking_id:
+        query = query.filter(Booking.id != exclude_booking_id)
+    return query
+
+
+def overlapping(query, start_date, end_date):
+    """Restrict a Booking query to ranges overlapping [start_date, end_date)"""
+    from ..models import Booking
+    return query.filter(Booking.start_date < end_date, Booking.end_date > start_date)
+
+
+def find_conflict(db, dress_id: int, start_date, end_date, exclude_booking_id: int = None):
+    """Earliest blocking booking overlapping [start_date, end_date), or None"""
+    from ..models import Booking
+    query = overlapping(blocking_bookings(db, dress_id, exclude_booking_id), start_date, end_date)
+    return query.order_by(Booking.start_date).first()
+
+
+def find_conflicts(db, requests):
+    """Blocking bookings overlapping any of many (dress_id, start_date, end_date) ranges, in one query.
+
+    Returns {(dress_id, start_date, end_date): first overlapping (start_date, end_date)}
+    for the requested ranges that conflict.
+    """
+    from sqlalchemy import or_, and_
+    from ..models import Booking, BLOCKING_BOOKING_STATUSES
+
+    requests = list(requests)
+    if not requests:
+        return {}
+    rows = db.query(Booking.dress_id, Booking.start_date, Booking.end_date).filter(
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES),
+        or_(*[
+            and_(Booking.dress_id == dress_id, Booking.start_date < end_date, Booking.end_date > start_date)
+            for dress_id, start_date, end_date in requests
+        ])
+    ).order_by(Booking.dress_id, Booking.start_date).all()
+
+    conflicts = {}
+    for dress_id, start_date, end_date in requests:
+        for booked_dress_id, booked_start, booked_end in rows:
+            if booked_dress_id == dress_id and booked_start < end_date and booked_end > start_date:
+                conflicts[(dress_id, start_date, end_date)] = (booked_start, booked_end)
+                break
+    return conflicts
+
+
+class IntervalIndex:
+    """Static interval index over one dress's bookings.
+
+    Intervals are sorted by start with a running maximum of end dates.
+    overlapping bisects for the last start before the window and walks back
+    until no earlier interval can reach into it; one long early booking keeps
+    the running maximum high, so the walk can pass non-overlapping intervals
+    and is O(n) worst case. A dress has at most a few hundred bookings, so
+    that is cheap enough.
+    """
+
+    def __init__(self, intervals):
+        # intervals: (start_date, end_date, status, booking_id)
+        self.intervals = sorted(intervals, key=lambda item: (item[0], item[3]))
+        self.starts = [item[0] for item in self.intervals]
+        self.max_ends = []
+        running = None
+        for item in self.intervals:
+            running = item[1] if running is None or item[1] > running else running
+            self.max_ends.append(running)
+
+    def overlapping(self, start_date, end_date):
+        """Intervals overlapping [start_date, end_date), ordered by start"""
+        hits = []
+        i = bisect_left(self.starts, end_date) - 1
+        while i >= 0 and self.max_ends[i] > start_date:
+            if self.intervals[i][1] > start_date:
+                hits.append(self.intervals[i])
+            i -= 1
+        hits.reverse()
+        return hits
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+def interval_index(db, dress_id: int) -> IntervalIndex:
+    """IntervalIndex of a dress's blocking bookings, from the worker cache when current"""
+    from ..models import Booking, BLOCKING_BOOKING_STATUSES
+
+    cache_key = (dress_id, get_version(db, booking_version_name(dress_id)))
+    if AVAILABILITY_CACHE_ENABLED:
+        found, index = interval_cache.get(cache_key)
+        if found:
+            return index
+
+    rows = db.query(Booking.start_date, Booking.end_date, Booking.status, Booking.id).filter(
+        Booking.dress_id == dress_id,
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES)
+    ).all()
+    index = IntervalIndex([tuple(row) for row in rows])
+    if AVAILABILITY_CACHE_ENABLED:
+        interval_cache.set(cache_key, index)
+    return index
+
+
+def booked_ranges(db, dress_id: int, start_date, end_date):
+    """[(start_date, end_date, status, booking_id)] booked within [start_date, end_date)"""
+    from ..models import Booking, BLOCKING_BOOKING_STATUSES
+
+    if AVAILABILITY_CACHE_ENABLED:
+        return interval_index(db, dress_id).overlapping(start_date, end_date)
+    rows = overlapping(
+        db.query(Booking.start_date, Booking.end_date, Booking.status, Booking.id).filter(
+            Booking.dress_id == dress_id,
+            Booking.status.in_(BLOCKING_BOOKING_STATUSES)
+        ),
+        start_date, end_date
+    ).order_by(Booking.start_date).all()
+    return [tuple(row) for row in rows]
+
+
+def next_free_start(intervals, start_date, end_date):
+    """First date on or after start_date where a stay as long as [start_date, end_date) fits.
+
+    intervals are (start_date, end_date, ...) tuples sorted by start.
+    """
+    length = end_date - start_date
+    candidate = start_date
+    for booked_start, booked_end, *_ in intervals:
+        if booked_end <= candidate:
+            continue
+        if booked_start >= candidate + length:
+            break
+        candidate = max(candidate, booked_end)
+    return candidate
+
+
+def booked_intervals(db, dress_id: int, from_date):
+    """[(start_date, end_date)] of a dress's blocking bookings ending after from_date, sorted (one query)"""
+    from ..models import Booking, BLOCKING_BOOKING_STATUSES
+
+    rows = db.query(Booking.start_date, Booking.end_date).filter(
+        Booking.dress_id == dress_id,
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES),
+        Booking.end_date > from_date
+    ).order_by(Booking.start_date).all()
+    return [tuple(row) for row in rows]
+
+
+def suggest_windows(intervals, start_date, end_date, k: int = 3, earliest=None):
+    """The k nearest free windows as long as [start_date, end_date), before and after it.
+
+    intervals are sorted (start_date, end_date) bookings. They are merged into busy
+    blocks; in each free gap, back-to-back windows are taken starting from the
+    side closest to the requested dates. No window starts before `earliest`,
+    even when the requested dates are already past. Returns ([(start, end)] before, nearest first; [(start, end)] after).
+    """
+    length = end_date - start_date
+    busy = []
+    for booked_start, booked_end in intervals:
+        if busy and booked_start <= busy[-1][1]:
+            busy[-1][1] = max(busy[-1][1], booked_end)
+        else:
+            busy.append([booked_start, booked_end])
+
+    # Free gaps as (gap_start, gap_end); None means unbounded
+    gaps = []
+    previous_end = None
+    for block_start, block_end in busy:
+        gaps.append((previous_end, block_start))
+        previous_end = block_end
+    gaps.append((previous_end, None))
+
+    first = start_date if earliest is None else max(start_date, earliest)
+    after = []
+    for gap_start, gap_end in gaps:
+        candidate = first if gap_start is None else max(gap_start, first)
+        # Back-to-back windows while the gap has room
+        while len(after) < k and (gap_end is None or candidate + length <= gap_end):
+            after.append((candidate, candidate + length))
+            candidate += length
+        if len(after) >= k:
+            break
+
+    before = []
+    for gap_start, gap_end in reversed(gaps):
+        candidate = start_date - timedelta(days=1)
+        if gap_end is not None:
+            candidate = min(candidate, gap_end - length)
+        while (
+            len(before) < k
+            and (gap_start is None or candidate >= gap_start)
+            and (earliest is None or candidate >= earliest)
+        ):
+            before.append((candidate, candidate + length))
+            candidate -= length
+        if len(before) >= k or (earliest is not None and candidate < earliest):
+            break
+
+    return before, after
+
+
+def bookings_for_dresses(db, dress_ids, from_date):
+    """One grouped query for many dresses.
+
+    Returns ({dress_id: is_available}, {dress_id: [(start_date, end_date)] sorted})
+    for the dresses that exist, with their blocking bookings ending after from_date.
+    """
+    from sqlalchemy import and_
+    from ..models import Booking, Product, BLOCKING_BOOKING_STATUSES
+
+    rows = db.query(Product.id, Product.is_available, Booking.start_date, Booking.end_date).outerjoin(
+        Booking,
+        and_(
+            Booking.dress_id == Product.id,
+            Booking.status.in_(BLOCKING_BOOKING_STATUSES),
+            Booking.end_date > from_date
+        )
+    ).filter(Product.id.in_(dress_ids)).order_by(Product.id, Booking.start_date).all()
+
+    listed, booked = {}, {}
+    for dress_id, is_available, start_date, end_date in rows:
+        listed[dress_id] = bool(is_available)
+        intervals = booked.setdefault(dress_id, [])
+        if start_date is not None:
+            intervals.append((start_date, end_date))
+    return listed, booked
+
+
+def busy_runs(index: IntervalIndex, year: int, month: int):
+    """Booked days of a month as [first_day, length] runs (a day is busy if a booking covers its night)"""
+    first = date(year, month, 1)
+    days = calendar.monthrange(year, month)[1]
+    busy = [False] * days
+    for booked_start, booked_end, *_ in index.overlapping(first, first + timedelta(days=days)):
+        start_day = max((booked_start - first).days, 0)
+        end_day = min((booked_end - first).days, days)
+        for day in range(start_day, end_day):
+            busy[day] = True
+
+    runs = []
+    for day, is_busy in enumerate(busy, start=1):
+        if not is_busy:
+            continue
+        if runs and runs[-1][0] + runs[-1][1] == day:
+            runs[-1][1] += 1
+        else:
+            runs.append([day, 1])
+    return runs
+
+
+def runs_to_bitmap(runs, days: int) -> str:
+    """Base64 bitmap of a month, bit (day - 1) set when the day is busy (LSB first)"""
+    bits = bytearray((days + 7) // 8)
+    for first_day, length in runs:
+        for day in range(first_day - 1, first_day - 1 + length):
+            bits[day // 8] |= 1 << (day % 8)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+def calendar_months(db, dress_id: int, year: int, month: int, months: int):
+    """[(year, month, days, runs)] for consecutive months, cached per dress/month"""
+    version = get_version(db, booking_version_name(dress_id))
+    index = None
+    result = []
+    for offset in range(months):
+        y, m = divmod((year * 12 + month - 1) + offset, 12)
+        m += 1
+        cache_key = (dress_id, y, m, version)
+        found, runs = calendar_cache.get(cache_key)
+        if not found:
+            if index is None:
+                index = interval_index(db, dress_id)
+            runs = busy_runs(index, y, m)
+            calendar_cache.set(cache_key, runs)
+        result.append((y, m, calendar.monthrange(y, m)[1], runs))
+    return result
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from sqlalchemy import func, extract, cast, case, insert, Integer
+
+# Owner dashboard rollup.
+# owner_booking_stats keeps one row per (dress, start month, status) with the
+# booking count and revenue, so the summary is a few GROUP BYs over a table
+# that grows with dresses x months, not with bookings. Every write that changes
+# a dress's bookings (create, checkout, status change, cancel, the lifecycle
+# job, dress deletion) recomputes that dress's rows in the same transaction,
+# under the dress's calendar lock, so the rollup can't drift.
+
+
+def refresh_booking_stats(db, dress_ids):
+    """Recompute the rollup rows of some dresses from their bookings (caller commits)"""
+    from ..models import Booking, Product, OwnerBookingStat
+
+    dress_ids = sorted(set(dress_ids))
+    if not dress_ids:
+        return
+    db.flush()  # pending booking changes must be visible to the INSERT ... SELECT
+    db.query(OwnerBookingStat).filter(OwnerBookingStat.dress_id.in_(dress_ids)).delete(
+        synchronize_session=False
+    )
+    year = cast(extract("year", Booking.start_date), Integer)
+    month = cast(extract("month", Booking.start_date), Integer)
+    db.execute(insert(OwnerBookingStat).from_select(
+        ["owner_id", "dress_id", "year", "month", "status", "booking_count", "revenue"],
+        db.query(
+            Product.owner_id,
+            Booking.dress_id,
+            year,
+            month,
+            Booking.status,
+            func.count(Booking.id),
+            func.coalesce(func.sum(Booking.total_price), 0)
+        ).join(Product, Product.id == Booking.dress_id).filter(
+            Booking.dress_id.in_(dress_ids),
+            Booking.start_date.isnot(None),
+            Booking.status.isnot(None)
+        ).group_by(Product.owner_id, Booking.dress_id, year, month, Booking.status).statement
+    ))
+
+
+def rebuild_booking_stats(engine, batch_size: int = 500):
+    """Build the rollup if it is empty but bookings exist (first deploy, or after a wipe)"""
+    from sqlalchemy.orm import Session
+    from ..models import Booking, OwnerBookingStat
+
+    with Session(engine) as db:
+        if db.query(OwnerBookingStat.id).first() is not None:
+            return
+        dress_ids = [dress_id for (dress_id,) in db.query(Booking.dress_id).distinct().all()]
+        if not dress_ids:
+            return
+        for i in range(0, len(dress_ids), batch_size):
+            refresh_booking_stats(db, dress_ids[i:i + batch_size])
+            db.commit()
+        print(f"✅ Built booking stats for {len(dress_ids)} dresses")
+
+
+def owner_summary(db, owner_id: int, today, months: int = 12, upcoming_days: int = 14, top_dresses: int = 50):
+    """Totals per status, earnings per month and per dress from the rollup, plus upcoming pickups"""
+    from ..models import Booking, Product, OwnerBookingStat, EARNING_BOOKING_STATUSES
+
+    stats = OwnerBookingStat
+    earning = stats.status.in_(EARNING_BOOKING_STATUSES)
+
+    by_status = db.query(
+        stats.status, func.sum(stats.booking_count), func.sum(stats.revenue)
+    ).filter(stats.owner_id == owner_id).group_by(stats.status).all()
+
+    # Last `months` months including the current one
+    first_month = today.year * 12 + today.month - months
+    month_key = stats.year * 12 + stats.month
+    by_month = db.query(
+        stats.year, stats.month, func.sum(stats.booking_count), func.sum(stats.revenue)
+    ).filter(
+        stats.owner_id == owner_id, earning, month_key > first_month, month_key <= today.year * 12 + today.month
+    ).group_by(stats.year, stats.month).order_by(stats.year, stats.month).all()
+
+    earned = func.sum(case((earning, stats.revenue), else_=0))
+    by_dress = db.query(
+        stats.dress_id, Product.name, func.sum(stats.booking_count), earned
+    ).outerjoin(Product, Product.id == stats.dress_id).filter(
+        stats.owner_id == owner_id
+    ).group_by(stats.dress_id, Product.name).order_by(earned.desc(), stats.dress_id).limit(top_dresses).all()
+
+    # Pickups come straight from bookings: a bounded date range on the booking index
+    upcoming = db.query(Booking.id, Booking.dress_id, Product.name, Booking.renter_id, Booking.start_date,
+                        Booking.end_date, Booking.status).join(Product, Product.id == Booking.dress_id).filter(
+        Product.owner_id == owner_id,
+        Booking.status.in_(["pending", "confirmed"]),
+        Booking.start_date >= today,
+        Booking.start_date < today + timedelta(days=upcoming_days)
+    ).order_by(Booking.start_date, Booking.id).limit(50).all()
+
+    return {
+        "totals": {
+            "bookings": sum(count or 0 for _, count, _ in by_status),
+            "earnings": round(sum(revenue or 0 for status, _, revenue in by_status if status in EARNING_BOOKING_STATUSES), 2),
+        },
+        "by_status": {
+            status: {"bookings": count or 0, "revenue": round(revenue or 0, 2)}
+            for status, count, revenue in by_status
+        },
+        "earnings_by_month": [
+            {"month": f"{year:04d}-{month:02d}", "bookings": count or 0, "earnings": round(revenue or 0, 2)}
+            for year, month, count, revenue in by_month
+        ],
+        "by_dress": [
+            {"dress_id": dress_id, "name": name, "bookings": count or 0, "earnings": round(revenue or 0, 2)}
+            for dress_id, name, count, revenue in by_dress
+        ],
+        "upcoming_pickups": [
+            {
+                "booking_id": booking_id,
+                "dress_id": dress_id,
+                "dress_name": name,
+                "renter_id": renter_id,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "status": status
+            }
+            for booking_id, dress_id, name, renter_id, start_date, end_date, status in upcoming
+        ],
+    }
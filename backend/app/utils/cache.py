@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+from sqlalchemy.exc import IntegrityError
+
+# Small in-process caches.
+# Every gunicorn worker keeps its own TTLCache, so entries are keyed by a version
+# counter stored in the database (cache_versions table). Write paths bump the
+# counter in the same transaction as the write, which makes every worker miss
+# on its next read without any cross-process messaging.
+
+# Bumped by every write that changes public catalog data: products, images,
+# reviews and bookings
+CATALOG_VERSION = "catalog"
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time to live"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def get_version(db, name: str) -> int:
+    """Read the current value of a shared version counter"""
+    from ..models import CacheVersion
+    version = db.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+
+def bump_version(db, name: str):
+    """Increment a version counter inside the caller's transaction (caller commits)"""
+    from ..models import CacheVersion
+    updated = db.query(CacheVersion).filter(CacheVersion.name == name).update(
+        {CacheVersion.version: CacheVersion.version + 1},
+        synchronize_session=False
+    )
+    if updated:
+        return
+    # First bump ever for this counter
+    try:
+        with db.begin_nested():
+            db.add(CacheVersion(name=name, version=1))
+    except IntegrityError:
+        # Another worker created it concurrently
+        db.query(CacheVersion).filter(CacheVersion.name == name).update(
+            {CacheVersion.version: CacheVersion.version + 1},
+            synchronize_session=False
+        )
+
+
+def bump_versions(db, names):
+    """Increment several counters (caller commits), locking their rows in name order"""
+    from ..models import CacheVersion
+    names = sorted(set(names))
+    existing = [name for (name,) in db.query(CacheVersion.name).filter(
+        CacheVersion.name.in_(names)
+    ).order_by(CacheVersion.name).with_for_update().all()]
+    if existing:
+        db.query(CacheVersion).filter(CacheVersion.name.in_(existing)).update(
+            {CacheVersion.version: CacheVersion.version + 1},
+            synchronize_session=False
+        )
+    for name in names:
+        if name not in existing:
+            bump_version(db, name)
+
+
+# Cached results of public, read-heavy catalog endpoints
+response_cache = TTLCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+)
+
+
+def bump_catalog_version(db):
+    """Invalidate cached catalog reads on every worker once the caller commits"""
+    bump_version(db, CATALOG_VERSION)
+
+
+def get_versions(db, names) -> tuple:
+    """Current values of several version counters, in the given order (one query)"""
+    from ..models import CacheVersion
+    found = dict(db.query(CacheVersion.name, CacheVersion.version).filter(CacheVersion.name.in_(names)).all())
+    return tuple(found.get(name) or 0 for name in names)
+
+
+def catalog_cache_key(db, route: str, versions=(), **params):
+    """Cache key for a catalog read: route, current catalog version and normalized params.
+
+    Reads that also depend on other counters (e.g. one dress's bookings) pass
+    their names as `versions`.
+    """
+    normalized = tuple(sorted(
+        (name, value.strip() if isinstance(value, str) else value)
+        for name, value in params.items()
+        if value is not None and value != ""
+    ))
+    if versions:
+        return (route, get_versions(db, [CATALOG_VERSION, *versions]), normalized)
+    return (route, get_version(db, CATALOG_VERSION), normalized)
+
+
+def make_etag(cache_key) -> str:
+    """Strong ETag for a catalog read, changes whenever its cache key does"""
+    return '"' + hashlib.sha1(repr(cache_key).encode()).hexdigest() + '"'
+
+
+def check_etag(request, response, cache_key):
+    """Set the ETag header, returns a 304 response if the client already has this version"""
+    etag = make_etag(cache_key)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func
+from starlette.concurrency import run_in_threadpool
+
+# Soft holds on cart dates.
+# Adding a dress to the cart reserves its dates for CART_HOLD_MINUTES, so
+# another renter can't book or cart the same range in the meantime and the
+# checkout doesn't fail at the last step. A hold is one date_holds row per cart
+# item; it's written under the same per-dress calendar lock as bookings.
+# Conflict checks ignore holds past expires_at, so an expired hold stops
+# blocking immediately; the sweeper only deletes the dead rows, in batches.
+# The cart item itself stays, checkout just re-checks its dates.
+
+HOLD_MINUTES = int(os.getenv("CART_HOLD_MINUTES", "15"))
+SWEEP_SECONDS = float(os.getenv("HOLD_SWEEP_SECONDS", "30"))
+SWEEP_BATCH_SIZE = int(os.getenv("HOLD_SWEEP_BATCH_SIZE", "500"))
+
+stats = {
+    "placed": 0,
+    "renewed": 0,
+    "released": 0,
+    "converted": 0,
+    "expired": 0,
+    "sweeps": 0,
+    "last_sweep_at": None,
+    "last_sweep_ms": None,
+}
+
+_sweeper_task = None
+
+
+def active_holds(db, exclude_user_id: int = None):
+    """Query of the holds that haven't expired, optionally without one renter's own"""
+    from ..models import DateHold
+
+    query = db.query(DateHold).filter(DateHold.expires_at > datetime.utcnow())
+    if exclude_user_id:
+        query = query.filter(DateHold.user_id != exclude_user_id)
+    return query
+
+
+def find_hold(db, dress_id: int, start_date, end_date, exclude_user_id: int = None):
+    """Earliest active hold on a dress overlapping [start_date, end_date), or None"""
+    from ..models import DateHold
+
+    return active_holds(db, exclude_user_id).filter(
+        DateHold.dress_id == dress_id,
+        DateHold.start_date < end_date,
+        DateHold.end_date > start_date
+    ).order_by(DateHold.start_date).first()
+
+
+def find_holds(db, requests, exclude_user_id: int = None):
+    """Active holds overlapping any of many (dress_id, start_date, end_date) ranges, in one query.
+
+    Returns {(dress_id, start_date, end_date): first overlapping DateHold}
+    for the requested ranges that are held.
+    """
+    from ..models import DateHold
+
+    requests = list(requests)
+    if not requests:
+        return {}
+    holds = active_holds(db, exclude_user_id).filter(or_(*[
+        and_(DateHold.dress_id == dress_id, DateHold.start_date < end_date, DateHold.end_date > start_date)
+        for dress_id, start_date, end_date in requests
+    ])).order_by(DateHold.dress_id, DateHold.start_date).all()
+
+    held = {}
+    for dress_id, start_date, end_date in requests:
+        for hold in holds:
+            if hold.dress_id == dress_id and hold.start_date < end_date and hold.end_date > start_date:
+                held[(dress_id, start_date, end_date)] = hold
+                break
+    return held
+
+
+def held_intervals(db, dress_id: int, from_date, exclude_user_id: int = None):
+    """[(start_date, end_date)] of a dress's active holds ending after from_date, sorted"""
+    from ..models import DateHold
+
+    rows = db.query(DateHold.start_date, DateHold.end_date).filter(
+        DateHold.dress_id == dress_id,
+        DateHold.expires_at > datetime.utcnow(),
+        DateHold.end_date > from_date
+    )
+    if exclude_user_id:
+        rows = rows.filter(DateHold.user_id != exclude_user_id)
+    return [tuple(row) for row in rows.order_by(DateHold.start_date).all()]
+
+
+def place_hold(db, cart_item):
+    """Hold the dates of a (flushed) cart item for HOLD_MINUTES from now, caller commits"""
+    from ..models import DateHold
+
+    expires_at = datetime.utcnow() + timedelta(minutes=HOLD_MINUTES)
+    hold = db.query(DateHold).filter(DateHold.cart_id == cart_item.id).first()
+    if hold:
+        stats["renewed"] += 1
+    else:
+        hold = DateHold(cart_id=cart_item.id, user_id=cart_item.user_id)
+        db.add(hold)
+        stats["placed"] += 1
+    hold.dress_id = cart_item.product_id
+    hold.start_date = cart_item.start_date
+    hold.end_date = cart_item.end_date
+    hold.expires_at = expires_at
+    return hold
+
+
+def release_holds(db, user_id: int, cart_ids=None, converted: bool = False):
+    """Drop a renter's holds (all of them, or those of some cart items), caller commits"""
+    from ..models import DateHold
+
+    query = db.query(DateHold).filter(DateHold.user_id == user_id)
+    if cart_ids is not None:
+        query = query.filter(DateHold.cart_id.in_(cart_ids))
+    released = query.delete(synchronize_session=False)
+    stats["converted" if converted else "released"] += released
+    return released
+
+
+def sweep_once(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Delete expired holds in batches of batch_size, returns how many were deleted"""
+    from ..database import SessionLocal
+    from ..models import DateHold
+
+    started = time.monotonic()
+    db = SessionLocal()
+    total = 0
+    try:
+        while True:
+            ids = db.query(DateHold.id).filter(
+                DateHold.expires_at <= datetime.utcnow()
+            ).order_by(DateHold.id).limit(batch_size).with_for_update(skip_locked=True)
+            ids = [row.id for row in ids]
+            if not ids:
+                break
+            total += db.query(DateHold).filter(DateHold.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            if len(ids) < batch_size:
+                break
+    finally:
+        db.rollback()
+        db.close()
+
+    stats["expired"] += total
+    stats["sweeps"] += 1
+    stats["last_sweep_at"] = datetime.utcnow().isoformat()
+    stats["last_sweep_ms"] = round((time.monotonic() - started) * 1000, 1)
+    if total:
+        print(f"⏳ Expired {total} cart hold(s)")
+    return total
+
+
+async def run_sweeper():
+    """Sweep expired holds every SWEEP_SECONDS"""
+    while True:
+        try:
+            await run_in_threadpool(sweep_once)
+        except Exception as e:
+            print(f"⚠️ Hold sweeper error: {e}")
+        await asyncio.sleep(SWEEP_SECONDS)
+
+
+def start_sweeper():
+    global _sweeper_task
+    if _sweeper_task is None:
+        _sweeper_task = asyncio.create_task(run_sweeper())
+        print(f"⏳ Cart hold sweeper started (holds last {HOLD_MINUTES} min)")
+
+
+async def stop_sweeper():
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
+
+
+def hold_metrics(db):
+    """Active and expired-but-unswept holds from the database plus this worker's counters"""
+    from ..models import DateHold
+
+    now = datetime.utcnow()
+    active = db.query(func.count(DateHold.id)).filter(DateHold.expires_at > now).scalar()
+    expired = db.query(func.count(DateHold.id)).filter(DateHold.expires_at <= now).scalar()
+    return {
+        "hold_minutes": HOLD_MINUTES,
+        "active": active,
+        "awaiting_sweep": expired,
+        "worker": dict(stats),
+    }
@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import IntegrityError
+
+# Idempotency-Key support for POST endpoints that create things (orders, bookings).
+# The first request with a key claims it by inserting an "in_progress" row and
+# committing; duplicates hit the unique constraint, wait for that row to become
+# "done" and replay the stored status and body instead of running the handler.
+# Keys are scoped per user and route, and expire after IDEMPOTENCY_TTL_HOURS.
+# Only outcomes that a retry can't change are stored (STORED_STATUSES); a 409
+# (dates taken, cart hold), a 503 lock timeout or any other error releases the
+# key so the retry runs the handler again.
+
+TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# A claim older than this with no result is treated as abandoned (worker died)
+LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))
+POLL_SECONDS = 0.1
+PURGE_EVERY_SECONDS = 3600
+MAX_KEY_LENGTH = 255
+
+# Success, plus client errors that repeat for the same request
+STORED_STATUSES = {400, 403, 404, 422}
+
+_last_purge = 0.0
+
+
+def _fingerprint(params: dict) -> str:
+    """Hash of the request parameters, so a key can't be reused for a different request"""
+    canonical = json.dumps(jsonable_encoder(params), sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _purge_expired(db):
+    """Delete expired keys, at most once an hour per worker"""
+    global _last_purge
+    from ..models import IdempotencyKey
+
+    if time.monotonic() - _last_purge < PURGE_EVERY_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    db.query(IdempotencyKey).filter(IdempotencyKey.expires_at < datetime.utcnow()).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def _claim(db, user_id: int, route: str, key: str, fingerprint: str):
+    """Insert the in_progress row, returns True if this request owns the key"""
+    from ..models import IdempotencyKey
+
+    now = datetime.utcnow()
+    try:
+        db.add(IdempotencyKey(
+            user_id=user_id,
+            route=route,
+            key=key,
+            fingerprint=fingerprint,
+            status="in_progress",
+            created_at=now,
+            expires_at=now + timedelta(hours=TTL_HOURS)
+        ))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+def _existing(db, user_id: int, route: str, key: str):
+    from ..models import IdempotencyKey
+    return db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.route == route,
+        IdempotencyKey.key == key
+    ).populate_existing().first()
+
+
+def _take_over(db, record, fingerprint: str) -> bool:
+    """Reclaim an expired or abandoned key, returns True if this request won it"""
+    from ..models import IdempotencyKey
+
+    now = datetime.utcnow()
+    taken = db.query(IdempotencyKey).filter(
+        IdempotencyKey.id == record.id,
+        IdempotencyKey.created_at == record.created_at
+    ).update({
+        IdempotencyKey.status: "in_progress",
+        IdempotencyKey.fingerprint: fingerprint,
+        IdempotencyKey.response_status: None,
+        IdempotencyKey.response_body: None,
+        IdempotencyKey.created_at: now,
+        IdempotencyKey.expires_at: now + timedelta(hours=TTL_HOURS),
+    }, synchronize_session=False)
+    db.commit()
+    return taken == 1
+
+
+def _store(db, user_id: int, route: str, key: str, status_code: int, body):
+    from ..models import IdempotencyKey
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.route == route,
+        IdempotencyKey.key == key
+    ).update({
+        IdempotencyKey.status: "done",
+        IdempotencyKey.response_status: status_code,
+        IdempotencyKey.response_body: json.dumps(body),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _release(db, user_id: int, route: str, key: str):
+    """Forget a claim whose handler failed unexpectedly, so a retry runs again"""
+    from ..models import IdempotencyKey
+    db.rollback()
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.route == route,
+        IdempotencyKey.key == key,
+        IdempotencyKey.status == "in_progress"
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _is_final(status_code: int) -> bool:
+    return 200 <= status_code < 300 or status_code in STORED_STATUSES
+
+
+def _replay(record):
+    return JSONResponse(
+        status_code=record.response_status,
+        content=json.loads(record.response_body),
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def idempotent(route: str, response_model=None):
+    """Make a POST handler honour an Idempotency-Key header.
+
+    The handler must take `idempotency_key` (Header), `db` and `current_user`
+    parameters. The other parameters are fingerprinted, so reusing a key for
+    different parameters is a 422. Server-side state such as the cart is not
+    part of the fingerprint: a successful checkout empties the cart, and the
+    retry must still replay it.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(**kwargs):
+            key = kwargs.get("idempotency_key")
+            if not key:
+                return await handler(**kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+            db = kwargs["db"]
+            user_id = kwargs["current_user"].id
+            fingerprint = _fingerprint({
+                name: value for name, value in kwargs.items()
+                if name not in ("db", "current_user", "idempotency_key")
+            })
+            _purge_expired(db)
+
+            deadline = time.monotonic() + WAIT_SECONDS
+            while not _claim(db, user_id, route, key, fingerprint):
+                record = _existing(db, user_id, route, key)
+                if record is None:
+                    continue  # expired row purged in between, claim again
+
+                now = datetime.utcnow()
+                expired = record.expires_at <= now
+                abandoned = record.status == "in_progress" and record.created_at < now - timedelta(seconds=LOCK_SECONDS)
+                if expired or abandoned:
+                    if _take_over(db, record, fingerprint):
+                        break
+                    continue
+
+                if record.fingerprint != fingerprint:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used for a different request"
+                    )
+                if record.status == "done":
+                    return _replay(record)
+
+                # The first request is still running: wait for its result
+                if time.monotonic() > deadline:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="A request with this Idempotency-Key is still in progress"
+                    )
+                db.rollback()
+                await asyncio.sleep(POLL_SECONDS)
+
+            try:
+                result = await handler(**kwargs)
+            except HTTPException as e:
+                if not _is_final(e.status_code):
+                    _release(db, user_id, route, key)
+                    raise
+                db.rollback()  # drop whatever the handler left uncommitted
+                _store(db, user_id, route, key, e.status_code, {"detail": e.detail})
+                raise
+            except Exception:
+                _release(db, user_id, route, key)
+                raise
+
+            if isinstance(result, Response):
+                status_code = result.status_code
+                if not _is_final(status_code):
+                    _release(db, user_id, route, key)
+                    return result
+                body = json.loads(result.body) if result.body else None
+            else:
+                status_code = 200
+                if response_model is not None:
+                    result = response_model.model_validate(result)
+                body = jsonable_encoder(result)
+            _store(db, user_id, route, key, status_code, body)
+            return JSONResponse(status_code=status_code, content=body)
+
+        return wrapper
+    return decorator
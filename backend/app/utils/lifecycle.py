@@ -0,0 +1,110 @@
+import os
+from datetime import date, datetime
+from .availability import booking_version_name
+from .cache import bump_versions
+from .scheduler import scheduled_job
+from .booking_stats import refresh_booking_stats
+
+# Time-driven booking status changes, run by the scheduler in one worker.
+# Each transition is a set-based UPDATE over chunks of at most CHUNK_SIZE rows;
+# a chunk's status change, its notifications (one INSERT ... SELECT per
+# audience), the owner dashboard rollup and the per-dress cache invalidation
+# commit together.
+#
+#   confirmed/active, end_date passed  -> completed
+#   confirmed, start_date reached      -> active
+#   pending, start_date reached        -> expired (owner never confirmed)
+
+EVERY_SECONDS = float(os.getenv("BOOKING_LIFECYCLE_SECONDS", "300"))
+CHUNK_SIZE = int(os.getenv("BOOKING_LIFECYCLE_CHUNK", "500"))
+
+
+def _transitions(today):
+    from ..models import Booking
+
+    # (to status, from statuses, condition, [(audience, title, message prefix, message suffix)])
+    return [
+        ("completed", ["confirmed", "active"], Booking.end_date < today, [
+            ("renter", "Rental completed", "Your rental of ", " is complete. Leave a review!"),
+        ]),
+        ("active", ["confirmed"], Booking.start_date <= today, [
+            ("renter", "Rental started", "Your rental of ", " has started."),
+        ]),
+        ("expired", ["pending"], Booking.start_date <= today, [
+            ("renter", "Booking expired", "Your booking of ", " wasn't confirmed before its start date and has expired."),
+            ("owner", "Booking expired", "A booking request for ", " wasn't confirmed before its start date and has expired."),
+        ]),
+    ]
+
+
+def _notify(db, booking_ids, notifications):
+    """One INSERT ... SELECT per audience over the bookings of a chunk (caller commits)"""
+    from sqlalchemy import insert, literal
+    from ..models import Booking, Notification, Product
+
+    for audience, title, prefix, suffix in notifications:
+        user_id = Booking.renter_id if audience == "renter" else Product.owner_id
+        db.execute(insert(Notification).from_select(
+            ["user_id", "type", "title", "message", "related_id", "is_read"],
+            db.query(
+                user_id,
+                literal("booking"),
+                literal(title),
+                literal(prefix) + Product.name + literal(suffix),
+                Booking.id,
+                literal(False)
+            ).join(Product, Product.id == Booking.dress_id).filter(Booking.id.in_(booking_ids)).statement
+        ))
+
+
+def transition_chunk(db, to_status, from_statuses, condition, notifications, chunk_size: int = CHUNK_SIZE) -> int:
+    """Move one chunk of matching bookings to to_status and commit, returns how many moved"""
+    from ..models import Booking
+
+    rows = db.query(Booking.id, Booking.dress_id).filter(
+        Booking.status.in_(from_statuses),
+        condition
+    ).order_by(Booking.id).limit(chunk_size).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.rollback()
+        return 0
+    booking_ids = [row.id for row in rows]
+
+    # The filter is repeated so a booking an owner changed meanwhile is left alone
+    moved = db.query(Booking).filter(
+        Booking.id.in_(booking_ids),
+        Booking.status.in_(from_statuses),
+        condition
+    ).update({
+        Booking.status: to_status,
+        Booking.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
+    _notify(db, db.query(Booking.id).filter(
+        Booking.id.in_(booking_ids),
+        Booking.status == to_status
+    ).scalar_subquery(), notifications)
+
+    # Bumping the calendar versions also takes the dresses' locks before their rollup rows are rebuilt
+    dress_ids = {row.dress_id for row in rows}
+    bump_versions(db, [booking_version_name(dress_id) for dress_id in dress_ids])
+    refresh_booking_stats(db, dress_ids)
+    db.commit()
+    return moved
+
+
+@scheduled_job("booking_lifecycle", EVERY_SECONDS)
+def advance_bookings(db, today: date = None, chunk_size: int = CHUNK_SIZE):
+    """Apply every due status transition, returns {to status: bookings moved}"""
+    today = today or date.today()
+    result = {}
+    for to_status, from_statuses, condition, notifications in _transitions(today):
+        total = 0
+        while True:
+            moved = transition_chunk(db, to_status, from_statuses, condition, notifications, chunk_size)
+            total += moved
+            if moved < chunk_size:
+                break
+        result[to_status] = total
+        if total:
+            print(f"🔄 {total} booking(s) moved to {to_status}")
+    return result
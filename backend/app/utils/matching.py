@@ -0,0 +1,527 @@
+import os
+import re
+from sqlalchemy import or_, func
+from .cache import TTLCache, get_version, CATALOG_VERSION
+
+# Matching engine between new listings and pending DressRequests.
+# Every pending request is stored in request_match_terms once per normalized
+# dress_type token, together with its normalized size and budget_max. A new
+# dress looks up only the requests sharing one of its name/category tokens,
+# filtered by size and budget through the (term, size, budget_max) index, and
+# the few candidates left are checked with request_matches_dress.
+
+ANY_SIZE = "*"
+
+
+def normalize_tokens(text):
+    """Lowercase word tokens with a naive plural strip ("sarees" -> "saree")"""
+    tokens = set()
+    for token in re.findall(r"\w+", (text or "").lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+def normalize_size(size):
+    return size.strip().upper() if size and size.strip() else None
+
+
+# Index rows store tokens and sizes cut to their column's length so a long
+# word can't fail the insert; lookups cut the same way so they still hit.
+
+def index_terms(column, *texts):
+    """normalize_tokens of texts, cut to the length of the index column they go in"""
+    return {token[:column.type.length] for text in texts for token in normalize_tokens(text)}
+
+
+def index_size(column, size):
+    """normalize_size cut to the index column's length, None when there is no size"""
+    size = normalize_size(size)
+    return size[:column.type.length] if size else None
+
+
+def _is_pending(status):
+    from ..models import RequestStatus
+    if status is None:
+        return True  # column default
+    return status == RequestStatus.PENDING or str(getattr(status, "value", status)).lower() == "pending"
+
+
+def dress_type_matches(request_tokens, name_tokens, category_tokens):
+    """Token version of "dress_type in name/category or name/category in dress_type" """
+    if not request_tokens:
+        return False
+    dress_tokens = name_tokens | category_tokens
+    return bool(
+        request_tokens <= dress_tokens
+        or (name_tokens and name_tokens <= request_tokens)
+        or (category_tokens and category_tokens <= request_tokens)
+    )
+
+
+def request_matches_dress(request, dress):
+    """Whether a DressRequest is satisfied by a Product"""
+    if not dress_type_matches(
+        normalize_tokens(request.dress_type),
+        normalize_tokens(dress.name),
+        normalize_tokens(dress.category)
+    ):
+        return False
+
+    request_size, dress_size = normalize_size(request.size), normalize_size(dress.size)
+    if request_size and dress_size and request_size != dress_size:
+        return False
+
+    if request.color and dress.color and request.color.strip().lower() not in dress.color.lower():
+        return False
+
+    if request.budget_max and dress.price_per_day is not None and dress.price_per_day > request.budget_max:
+        return False
+
+    return True
+
+
+def index_request(db, request):
+    """(Re)index a DressRequest; non-pending requests are removed from the index.
+
+    Call after the request has an id (flush or commit), before the final commit.
+    """
+    from ..models import RequestMatchTerm
+
+    db.query(RequestMatchTerm).filter(RequestMatchTerm.request_id == request.id).delete(
+        synchronize_session=False
+    )
+    if not _is_pending(request.status):
+        return
+
+    size = index_size(RequestMatchTerm.size, request.size) or ANY_SIZE
+    db.add_all([
+        RequestMatchTerm(
+            request_id=request.id,
+            user_id=request.user_id,
+            term=term,
+            size=size,
+            budget_max=request.budget_max or None
+        )
+        for term in index_terms(RequestMatchTerm.term, request.dress_type)
+    ])
+
+
+def unindex_request(db, request_id: int):
+    """Drop a request from the index (deleted, fulfilled or cancelled)"""
+    from ..models import RequestMatchTerm
+    db.query(RequestMatchTerm).filter(RequestMatchTerm.request_id == request_id).delete(
+        synchronize_session=False
+    )
+
+
+def find_matching_requests(db, dress):
+    """Pending DressRequests (of other users) that a dress satisfies"""
+    return [request for request in find_candidate_requests(db, dress) if request_matches_dress(request, dress)]
+
+
+def find_candidate_requests(db, dress):
+    """Pending requests (of other users) sharing a token with a dress and accepting its size and price"""
+    from ..models import DressRequest, RequestMatchTerm
+
+    dress_tokens = index_terms(RequestMatchTerm.term, dress.name, dress.category)
+    if not dress_tokens:
+        return []
+
+    candidates = db.query(RequestMatchTerm.request_id).filter(
+        RequestMatchTerm.term.in_(dress_tokens),
+        RequestMatchTerm.user_id != dress.owner_id
+    )
+    dress_size = index_size(RequestMatchTerm.size, dress.size)
+    if dress_size:
+        candidates = candidates.filter(RequestMatchTerm.size.in_([dress_size, ANY_SIZE]))
+    if dress.price_per_day is not None:
+        candidates = candidates.filter(or_(
+            RequestMatchTerm.budget_max.is_(None),
+            RequestMatchTerm.budget_max >= dress.price_per_day
+        ))
+
+    requests = db.query(DressRequest).filter(
+        DressRequest.id.in_(candidates.distinct().scalar_subquery())
+    ).all()
+    return [request for request in requests if _is_pending(request.status)]
+
+
+def rebuild_request_index(engine):
+    """Index all pending requests if the index is empty (first deploy, or after a wipe)"""
+    from sqlalchemy.orm import Session
+    from ..models import DressRequest, RequestMatchTerm, RequestStatus
+
+    with Session(engine) as db:
+        if db.query(RequestMatchTerm.id).first() is not None:
+            return
+        pending = db.query(DressRequest).filter(DressRequest.status == RequestStatus.PENDING).all()
+        if not pending:
+            return
+        for request in pending:
+            index_request(db, request)
+        db.commit()
+        print(f"✅ Indexed {len(pending)} pending dress requests for matching")
+
+
+# ------------------------------------------------------------
+# Ranking of catalog matches for a request (/api/requests/{id}/matches)
+# ------------------------------------------------------------
+
+# Ranked (score, product_id) lists per request, keyed by the request's matching
+# fields and the catalog version so edits on either side recompute the scores
+match_score_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("MATCH_CACHE_TTL", "300")))
+
+SCORE_WEIGHTS = {
+    "text": 0.35,
+    "size": 0.20,
+    "budget": 0.20,
+    "color": 0.15,
+    "rating": 0.10,
+}
+
+STOPWORDS = {"a", "an", "and", "the", "for", "with", "in", "of", "to", "my", "i", "is", "it", "on", "or", "want", "need", "looking"}
+
+
+def text_tokens(*texts):
+    """Token list (with repeats) for TF-IDF, plurals folded like normalize_tokens"""
+    tokens = []
+    for text in texts:
+        for token in re.findall(r"\w+", (text or "").lower()):
+            if token in STOPWORDS:
+                continue
+            if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            tokens.append(token)
+    return tokens
+
+
+def _tfidf_vectors(documents):
+    """L2-normalized TF-IDF vectors for a list of token lists"""
+    import math
+    from collections import Counter
+
+    counts = [Counter(tokens) for tokens in documents]
+    df = Counter(term for count in counts for term in count)
+    n = len(documents)
+    vectors = []
+    for count in counts:
+        vector = {term: tf * (math.log((n + 1) / (df[term] + 1)) + 1) for term, tf in count.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vector.items()})
+    return vectors
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+def _color_score(request_color, dress_color):
+    if not request_color:
+        return 0.5
+    if not dress_color:
+        return 0.25
+    wanted, have = request_color.strip().lower(), dress_color.lower()
+    if wanted in have:
+        return 1.0
+    wanted_tokens, have_tokens = set(re.findall(r"\w+", wanted)), set(re.findall(r"\w+", have))
+    if not wanted_tokens or not have_tokens:
+        return 0.0
+    return len(wanted_tokens & have_tokens) / len(wanted_tokens | have_tokens)
+
+
+def _budget_score(budget_min, budget_max, price):
+    if price is None:
+        return 0.0
+    if not budget_max:
+        return 0.5
+    if price > budget_max:
+        return 0.0
+    low = budget_min or 0.0
+    if price < low or budget_max <= low:
+        return 1.0
+    # Inside the range: cheaper is a better fit
+    return 1.0 - 0.5 * (price - low) / (budget_max - low)
+
+
+def score_products(request, products):
+    """Rank products for a request, returns [(score, product_id)] best first"""
+    if not products:
+        return []
+
+    documents = [text_tokens(request.dress_type, request.occasion, request.description)]
+    documents += [
+        text_tokens(p.name, p.category, p.description, p.color, p.brand)
+        for p in products
+    ]
+    vectors = _tfidf_vectors(documents)
+    query_vector = vectors[0]
+    request_size = normalize_size(request.size)
+
+    ranked = []
+    for product, vector in zip(products, vectors[1:]):
+        parts = {
+            "text": _cosine(query_vector, vector),
+            "size": 1.0 if request_size and request_size == normalize_size(product.size) else 0.5,
+            "budget": _budget_score(request.budget_min, request.budget_max, product.price_per_day),
+            "color": _color_score(request.color, product.color),
+            "rating": min((product.average_rating or 0.0) / 5.0, 1.0),
+        }
+        score = sum(SCORE_WEIGHTS[name] * value for name, value in parts.items())
+        ranked.append((round(score, 6), product.id))
+
+    ranked.sort(key=lambda item: (-item[0], -item[1]))
+    return ranked
+
+
+def is_catalog_match(request, product):
+    """Rule for a request's match list: dress type, size and budget range; color only affects the score"""
+    if not product.is_available:
+        return False
+    if not dress_type_matches(
+        normalize_tokens(request.dress_type),
+        normalize_tokens(product.name),
+        normalize_tokens(product.category)
+    ):
+        return False
+    request_size, dress_size = normalize_size(request.size), normalize_size(product.size)
+    if request_size and dress_size and request_size != dress_size:
+        return False
+    price = product.price_per_day
+    if request.budget_min and (price is None or price < request.budget_min):
+        return False
+    if request.budget_max and price is not None and price > request.budget_max:
+        return False
+    return True
+
+
+def candidate_products(db, request):
+    """Available products matching a request: coarse SQL prefilter, exact rule in Python"""
+    from ..models import Product
+
+    tokens = normalize_tokens(request.dress_type)
+    if not tokens:
+        return []
+
+    query = db.query(Product).filter(
+        Product.is_available == True,
+        or_(*[
+            column.ilike(f"%{token}%")
+            for token in tokens
+            for column in (Product.category, Product.name)
+        ])
+    )
+    request_size = normalize_size(request.size)
+    if request_size:
+        query = query.filter(or_(
+            Product.size.is_(None),
+            Product.size == "",
+            func.upper(func.trim(Product.size)) == request_size
+        ))
+    if request.budget_min:
+        query = query.filter(Product.price_per_day >= request.budget_min)
+    if request.budget_max:
+        query = query.filter(Product.price_per_day <= request.budget_max)
+
+    return [product for product in query.all() if is_catalog_match(request, product)]
+
+
+def ranked_matches(db, request):
+    """Cached [(score, product_id)] for every available product matching a request"""
+    cache_key = (
+        request.id, request.dress_type, request.occasion, request.size, request.color,
+        request.budget_min, request.budget_max, request.description,
+        get_version(db, CATALOG_VERSION)
+    )
+    found, ranked = match_score_cache.get(cache_key)
+    if found:
+        return ranked
+
+    ranked = score_products(request, candidate_products(db, request))
+    match_score_cache.set(cache_key, ranked)
+    return ranked
+
+
+# ------------------------------------------------------------
+# Materialized match lists (request_matches table)
+# ------------------------------------------------------------
+
+# A request's ranked matches are computed once by the outbox worker when it is
+# posted or edited, and the lists a product belongs to are re-ranked when it is
+# listed, edited or withdrawn, so /api/requests/{id}/matches is a single seek.
+
+def refresh_request_matches(db, request):
+    """Recompute and store the ranked match list of one request (caller commits)"""
+    from ..models import RequestMatch
+
+    db.query(RequestMatch).filter(RequestMatch.request_id == request.id).delete(synchronize_session=False)
+    if not _is_pending(request.status):
+        return 0
+
+    ranked = score_products(request, candidate_products(db, request))
+    if ranked:
+        db.bulk_insert_mappings(RequestMatch, [
+            {"request_id": request.id, "product_id": product_id, "score": score}
+            for score, product_id in ranked
+        ])
+    return len(ranked)
+
+
+def refresh_matches_for_product(db, product):
+    """Recompute the match lists a product was on or now qualifies for (caller commits).
+
+    Scores use TF-IDF over each request's candidate set, so an affected request is
+    re-ranked as a whole; requests the product has nothing to do with are untouched.
+    """
+    from ..models import DressRequest, RequestMatch
+
+    affected = {
+        request_id for (request_id,) in
+        db.query(RequestMatch.request_id).filter(RequestMatch.product_id == product.id).all()
+    }
+    if product.is_available:
+        affected |= {
+            request.id for request in find_candidate_requests(db, product)
+            if is_catalog_match(request, product)
+        }
+    if not affected:
+        return 0
+
+    for request in db.query(DressRequest).filter(DressRequest.id.in_(affected)).all():
+        refresh_request_matches(db, request)
+    return len(affected)
+
+
+def rebuild_request_matches(engine):
+    """Fill the match lists of pending requests if none are stored (first deploy)"""
+    from sqlalchemy.orm import Session
+    from ..models import DressRequest, RequestMatch, RequestStatus
+
+    with Session(engine) as db:
+        if db.query(RequestMatch.id).first() is not None:
+            return
+        pending = db.query(DressRequest).filter(DressRequest.status == RequestStatus.PENDING).all()
+        if not pending:
+            return
+        stored = sum(refresh_request_matches(db, request) for request in pending)
+        db.commit()
+        print(f"✅ Stored {stored} catalog matches for {len(pending)} pending dress requests")
+
+
+def match_list_pending(db, request_id: int):
+    """Whether the stored match list of a request is still waiting on the outbox worker"""
+    from ..models import OutboxEvent
+    return db.query(OutboxEvent.id).filter(
+        OutboxEvent.kind == "request_matches",
+        OutboxEvent.entity_id == request_id,
+        OutboxEvent.status.in_(["pending", "processing"])
+    ).first() is not None
+
+
+def delete_product_matches(db, product_id: int):
+    from ..models import RequestMatch
+    db.query(RequestMatch).filter(RequestMatch.product_id == product_id).delete(synchronize_session=False)
+
+
+def delete_request_matches(db, request_id: int):
+    from ..models import RequestMatch
+    db.query(RequestMatch).filter(RequestMatch.request_id == request_id).delete(synchronize_session=False)
+
+
+# ------------------------------------------------------------
+# Owner inventory index (who to tell about a new request)
+# ------------------------------------------------------------
+
+# owner_inventory summarizes each owner's available listings per name/category
+# token and size, with the price range covered. It is rebuilt for one owner on
+# every listing write, so a new request finds the owners that could plausibly
+# serve it with one indexed query instead of notifying every user.
+
+def refresh_owner_inventory(db, owner_id: int):
+    """Rebuild one owner's inventory summary from their available listings (caller commits)"""
+    from ..models import OwnerInventory, Product
+
+    db.flush()  # sessions don't autoflush, the listing edit must be visible below
+    db.query(OwnerInventory).filter(OwnerInventory.owner_id == owner_id).delete(synchronize_session=False)
+    listings = db.query(Product.name, Product.category, Product.size, Product.price_per_day).filter(
+        Product.owner_id == owner_id,
+        Product.is_available == True,
+        Product.price_per_day.isnot(None)
+    ).all()
+
+    summary = {}
+    for name, category, size, price in listings:
+        for term in index_terms(OwnerInventory.term, name, category):
+            key = (term, index_size(OwnerInventory.size, size) or ANY_SIZE)
+            low, high, count = summary.get(key, (price, price, 0))
+            summary[key] = (min(low, price), max(high, price), count + 1)
+
+    if summary:
+        db.bulk_insert_mappings(OwnerInventory, [
+            {"owner_id": owner_id, "term": term, "size": size,
+             "min_price": low, "max_price": high, "product_count": count}
+            for (term, size), (low, high, count) in summary.items()
+        ])
+
+
+def matching_owners_query(request):
+    """SELECT of distinct owner ids whose inventory could satisfy a request"""
+    from sqlalchemy import select
+    from ..models import OwnerInventory
+
+    query = select(OwnerInventory.owner_id).where(
+        OwnerInventory.term.in_(index_terms(OwnerInventory.term, request.dress_type)),
+        OwnerInventory.owner_id != request.user_id
+    )
+    request_size = index_size(OwnerInventory.size, request.size)
+    if request_size:
+        query = query.where(OwnerInventory.size.in_([request_size, ANY_SIZE]))
+    if request.budget_max:
+        query = query.where(OwnerInventory.min_price <= request.budget_max)
+    if request.budget_min:
+        query = query.where(OwnerInventory.max_price >= request.budget_min)
+    return query.distinct()
+
+
+def notify_matching_owners(db, request):
+    """Insert a new_request notification for every matching owner in one statement (caller commits)"""
+    from sqlalchemy import insert, literal
+    from ..models import Notification
+
+    if not normalize_tokens(request.dress_type):
+        return 0
+    owners = matching_owners_query(request).subquery()
+    result = db.execute(insert(Notification).from_select(
+        ["user_id", "type", "title", "message", "request_id", "is_read"],
+        db.query(
+            owners.c.owner_id,
+            literal("new_request"),
+            literal("New Dress Request"),
+            literal(f"New dress request: {request.dress_type}"),
+            literal(request.id),
+            literal(False)
+        ).statement
+    ))
+    return result.rowcount
+
+
+def rebuild_owner_inventory(engine):
+    """Build the owner inventory index if it is empty (first deploy, or after a wipe)"""
+    from sqlalchemy.orm import Session
+    from ..models import OwnerInventory, Product
+
+    with Session(engine) as db:
+        if db.query(OwnerInventory.id).first() is not None:
+            return
+        owner_ids = [owner_id for (owner_id,) in db.query(Product.owner_id).filter(
+            Product.is_available == True
+        ).distinct().all()]
+        if not owner_ids:
+            return
+        for owner_id in owner_ids:
+            refresh_owner_inventory(db, owner_id)
+        db.commit()
+        print(f"✅ Indexed inventory of {len(owner_ids)} owners for request notifications")
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func
+from starlette.concurrency import run_in_threadpool
+
+# Transactional outbox for work that shouldn't hold up the request.
+# Routes call enqueue() in the same transaction as their write, so an event
+# exists if and only if the write committed. A background task in every worker
+# claims pending events in batches and runs the registered handler; the handler's
+# writes and the "done" mark commit together, so a crash at any point either
+# leaves the event claimable again or fully processed.
+#
+# A claim is a lease: a handler slower than LEASE_SECONDS can see its event
+# re-claimed by another worker. The done and retry marks are therefore
+# UPDATEs conditioned on this batch's locked_by token; when no row matches,
+# the claim was lost, the handler's writes are rolled back and the new owner
+# processes the event instead.
+
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+PURGE_EVERY_SECONDS = 3600
+
+HANDLERS = {}
+
+stats = {
+    "processed": 0,
+    "failed": 0,
+    "retried": 0,
+    "lost": 0,
+    "batches": 0,
+    "last_batch_at": None,
+    "last_batch_ms": None,
+}
+
+_wakeup = None
+_worker_task = None
+_last_purge = 0.0
+
+
+def outbox_handler(kind: str):
+    """Register the function that processes events of the given kind"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(db, kind: str, entity_id: int = None, payload: dict = None):
+    """Add an event to the outbox inside the caller's transaction (caller commits)"""
+    from ..models import OutboxEvent
+    db.add(OutboxEvent(
+        kind=kind,
+        entity_id=entity_id,
+        payload=json.dumps(payload) if payload else None
+    ))
+
+
+def wake_worker():
+    """Ask this process's worker to drain now instead of at the next poll"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _claim_batch(db, batch_size: int):
+    from ..models import OutboxEvent
+
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    claimable = or_(
+        and_(OutboxEvent.status == "pending", OutboxEvent.available_at <= now),
+        # Lease expired: the worker that claimed it died mid-batch
+        and_(OutboxEvent.status == "processing", OutboxEvent.locked_until < now)
+    )
+    ids = db.query(OutboxEvent.id).filter(claimable).order_by(OutboxEvent.id).limit(batch_size)
+    ids = ids.with_for_update(skip_locked=True).scalar_subquery()
+
+    # claimable is repeated so a row claimed by a concurrent worker is skipped
+    db.query(OutboxEvent).filter(OutboxEvent.id.in_(ids), claimable).update({
+        OutboxEvent.status: "processing",
+        OutboxEvent.locked_by: token,
+        OutboxEvent.locked_until: now + timedelta(seconds=LEASE_SECONDS),
+        OutboxEvent.attempts: OutboxEvent.attempts + 1,
+    }, synchronize_session=False)
+    db.commit()
+
+    events = db.query(OutboxEvent).filter(OutboxEvent.locked_by == token).order_by(OutboxEvent.id).all()
+    return token, events
+
+
+def _purge_done(db):
+    """Delete processed events older than RETENTION_DAYS, at most once an hour per worker"""
+    global _last_purge
+    from ..models import OutboxEvent
+
+    if time.monotonic() - _last_purge < PURGE_EVERY_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    db.query(OutboxEvent).filter(
+        OutboxEvent.status == "done",
+        OutboxEvent.processed_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def drain_once(batch_size: int = BATCH_SIZE) -> int:
+    """Claim and process one batch of events, returns how many were claimed"""
+    from ..database import SessionLocal
+    from ..models import OutboxEvent
+
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        # The token is kept here: a loaded event is expired by each commit and
+        # would re-read locked_by, possibly the new owner's
+        token, events = _claim_batch(db, batch_size)
+        for event in events:
+            event_id, kind = event.id, event.kind
+            owned = and_(
+                OutboxEvent.id == event_id,
+                OutboxEvent.status == "processing",
+                OutboxEvent.locked_by == token
+            )
+            handler = HANDLERS.get(kind)
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No outbox handler for '{kind}'")
+                handler(db, event)
+                marked = db.query(OutboxEvent).filter(owned).update({
+                    OutboxEvent.status: "done",
+                    OutboxEvent.processed_at: datetime.utcnow(),
+                    OutboxEvent.last_error: None,
+                }, synchronize_session=False)
+                if not marked:
+                    db.rollback()
+                    stats["lost"] += 1
+                    print(f"⚠️ Outbox event #{event_id} ({kind}) was re-claimed by another worker, dropping this run")
+                    continue
+                db.commit()
+                stats["processed"] += 1
+            except Exception as e:
+                db.rollback()
+                attempts = db.query(OutboxEvent.attempts).filter(owned).scalar()
+                if attempts is None:
+                    stats["lost"] += 1
+                    print(f"⚠️ Outbox event #{event_id} ({kind}) was re-claimed by another worker after failing: {e}")
+                    continue
+                if attempts >= MAX_ATTEMPTS:
+                    changes = {OutboxEvent.status: "failed"}
+                else:
+                    # Back off 2, 4, 8... seconds before the next attempt
+                    changes = {
+                        OutboxEvent.status: "pending",
+                        OutboxEvent.available_at: datetime.utcnow() + timedelta(seconds=2 ** attempts),
+                    }
+                changes[OutboxEvent.last_error] = str(e)[:1000]
+                if not db.query(OutboxEvent).filter(owned).update(changes, synchronize_session=False):
+                    db.rollback()
+                    stats["lost"] += 1
+                    continue
+                db.commit()
+                if attempts >= MAX_ATTEMPTS:
+                    stats["failed"] += 1
+                    print(f"❌ Outbox event #{event_id} ({kind}) failed for good: {e}")
+                else:
+                    stats["retried"] += 1
+                    print(f"⚠️ Outbox event #{event_id} ({kind}) will be retried: {e}")
+
+        if events:
+            stats["batches"] += 1
+            stats["last_batch_at"] = datetime.utcnow().isoformat()
+            stats["last_batch_ms"] = round((time.monotonic() - started) * 1000, 1)
+        else:
+            _purge_done(db)
+        return len(events)
+    finally:
+        db.close()
+
+
+async def run_worker():
+    """Drain the outbox forever: immediately after a wakeup, otherwise every POLL_SECONDS"""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            claimed = await run_in_threadpool(drain_once)
+        except Exception as e:
+            print(f"⚠️ Outbox worker error: {e}")
+            claimed = 0
+        if claimed >= BATCH_SIZE:
+            continue  # more work is probably waiting
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def start_worker():
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(run_worker())
+        print("📬 Outbox worker started")
+
+
+async def stop_worker():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+
+
+def outbox_metrics(db):
+    """Backlog and lag from the database plus this worker's counters"""
+    from ..models import OutboxEvent
+
+    backlog, oldest = db.query(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at)).filter(
+        OutboxEvent.status.in_(["pending", "processing"])
+    ).one()
+    failed = db.query(func.count(OutboxEvent.id)).filter(OutboxEvent.status == "failed").scalar()
+    return {
+        "backlog": backlog,
+        "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+        "failed_events": failed,
+        "worker": dict(stats),
+    }
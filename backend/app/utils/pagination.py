@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# Keyset (cursor) pagination helpers.
+# A cursor is an opaque token holding the sort name plus the sort value and id
+# of the last row on the previous page, so the next page is a plain index seek.
+# Sort columns must be NOT NULL: a NULL compares as unknown, so the seek would
+# silently stop there, and PG and SQLite place NULLs differently. They are
+# sorted raw so the (column, id) indexes serve both ORDER BY and the seek.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    """Build an opaque cursor pointing just after the given row"""
+    payload = json.dumps([sort, _encode_value(value), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """Return (value, id) from a cursor, checking it was issued for the same sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = _decode_value(value)
+        row_id = int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if cursor_sort != sort:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return value, row_id
+
+
+def apply_keyset(query, sort_expr, id_column, descending: bool, after=None):
+    """Order by (sort_expr, id) and seek past the `after` (value, id) pair if given"""
+    if descending:
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_column.asc())
+
+    if after is not None:
+        value, row_id = after
+        if descending:
+            query = query.filter(or_(sort_expr < value, and_(sort_expr == value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_expr > value, and_(sort_expr == value, id_column > row_id)))
+    return query
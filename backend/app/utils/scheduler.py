@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+# Periodic jobs that must run once per interval across all gunicorn workers.
+# Every worker polls, but a job only runs in the worker that takes its lease:
+# a scheduler_leases row whose locked_until is pushed one interval ahead by a
+# conditional UPDATE, which succeeds in exactly one worker. The lease is not
+# released after the run, so it also spaces the runs out.
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "30"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JOBS = {}
+
+stats = {}
+
+_scheduler_task = None
+
+
+def scheduled_job(name: str, every_seconds: float):
+    """Register a function(db) -> dict to run every every_seconds in one worker"""
+    def decorator(func):
+        JOBS[name] = (func, every_seconds)
+        return func
+    return decorator
+
+
+def acquire_lease(db, name: str, seconds: float) -> bool:
+    """Take the lease of a job for the next `seconds` if it's free, returns True if this worker got it"""
+    from ..models import SchedulerLease
+
+    now = datetime.utcnow()
+    lease = {
+        SchedulerLease.holder: WORKER_ID,
+        SchedulerLease.locked_until: now + timedelta(seconds=seconds),
+    }
+    taken = db.query(SchedulerLease).filter(
+        SchedulerLease.name == name,
+        SchedulerLease.locked_until <= now
+    ).update(lease, synchronize_session=False)
+    if taken:
+        db.commit()
+        return True
+    if db.query(SchedulerLease.name).filter(SchedulerLease.name == name).first() is not None:
+        db.rollback()
+        return False
+    # First run ever of this job
+    try:
+        db.add(SchedulerLease(name=name, holder=WORKER_ID, locked_until=now + timedelta(seconds=seconds)))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+def run_job(name: str, force: bool = False):
+    """Run one job if its lease is free (or unconditionally with force), returns its result or None"""
+    from ..database import SessionLocal
+    from ..models import SchedulerLease
+
+    func, every_seconds = JOBS[name]
+    db = SessionLocal()
+    try:
+        if not force and not acquire_lease(db, name, every_seconds):
+            return None
+        started = time.monotonic()
+        result = func(db)
+        db.query(SchedulerLease).filter(SchedulerLease.name == name).update({
+            SchedulerLease.last_run_at: datetime.utcnow(),
+            SchedulerLease.last_result: json.dumps(result, default=str),
+        }, synchronize_session=False)
+        db.commit()
+        stats[name] = {
+            "runs": stats.get(name, {}).get("runs", 0) + 1,
+            "last_run_at": datetime.utcnow().isoformat(),
+            "last_run_ms": round((time.monotonic() - started) * 1000, 1),
+            "last_result": result,
+        }
+        return result
+    finally:
+        db.rollback()
+        db.close()
+
+
+async def run_scheduler():
+    """Try every job's lease every POLL_SECONDS"""
+    while True:
+        for name in list(JOBS):
+            try:
+                await run_in_threadpool(run_job, name)
+            except Exception as e:
+                print(f"⚠️ Scheduled job '{name}' failed: {e}")
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def start_scheduler():
+    global _scheduler_task
+    if SCHEDULER_ENABLED and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(run_scheduler())
+        print(f"🕒 Scheduler started ({', '.join(JOBS) or 'no jobs'})")
+
+
+async def stop_scheduler():
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
+
+
+def scheduler_metrics(db):
+    """Lease state of every job from the database plus this worker's runs"""
+    from ..models import SchedulerLease
+
+    leases = {lease.name: lease for lease in db.query(SchedulerLease).all()}
+    jobs = {}
+    for name, (_, every_seconds) in JOBS.items():
+        lease = leases.get(name)
+        jobs[name] = {
+            "every_seconds": every_seconds,
+            "holder": lease.holder if lease else None,
+            "last_run_at": lease.last_run_at.isoformat() if lease and lease.last_run_at else None,
+            "last_result": json.loads(lease.last_result) if lease and lease.last_result else None,
+        }
+    return {"worker_id": WORKER_ID, "jobs": jobs, "worker": dict(stats)}
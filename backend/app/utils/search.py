@@ -0,0 +1,123 @@
+import re
+from sqlalchemy import text, or_, func, literal_column, Integer, Float
+
+# Full-text search over the product catalog.
+# SQLite (local dev) uses an FTS5 external-content table kept in sync by triggers,
+# PostgreSQL (Render) uses a generated tsvector column with a GIN index.
+
+FTS_COLUMNS = ["name", "description", "brand", "color", "category"]
+
+# bm25 column weights, same order as FTS_COLUMNS (name matters most)
+SQLITE_BM25_WEIGHTS = "10.0, 1.0, 4.0, 4.0, 6.0"
+
+MAX_SEARCH_TERMS = 8
+
+_fts_ready = {"sqlite": False, "postgresql": False}
+
+SQLITE_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        {", ".join(FTS_COLUMNS)},
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+        INSERT INTO products_fts(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END
+    """,
+]
+
+POSTGRES_FTS_DDL = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(brand, '') || ' ' || coalesce(color, '')), 'B') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+]
+
+
+def install_search_index(engine):
+    """Create the full-text index for products if it doesn't exist yet"""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+                )).first()
+                for ddl in SQLITE_FTS_DDL:
+                    conn.execute(text(ddl))
+                if not exists:
+                    # Index rows that were inserted before the triggers existed
+                    conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                for ddl in POSTGRES_FTS_DDL:
+                    conn.execute(text(ddl))
+            else:
+                return
+        _fts_ready[dialect] = True
+        print(f"✅ Product search index ready ({dialect})")
+    except Exception as e:
+        print(f"⚠️ Full-text search unavailable, falling back to LIKE search: {e}")
+
+
+def search_terms(search: str):
+    """Split raw user input into safe lowercase word tokens"""
+    return re.findall(r"\w+", (search or "").lower())[:MAX_SEARCH_TERMS]
+
+
+def apply_search(query, db, search: str, model):
+    """Filter a Product query by full-text match.
+
+    Returns (query, rank_column). rank_column sorts ascending, best match first,
+    and is None when the LIKE fallback is used.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return query, None
+
+    dialect = db.bind.dialect.name
+
+    if dialect == "sqlite" and _fts_ready["sqlite"]:
+        # Prefix match every term, FTS5 ANDs space separated phrases
+        match = " ".join(f'"{term}"*' for term in terms)
+        fts = text(
+            f"SELECT rowid AS product_id, bm25(products_fts, {SQLITE_BM25_WEIGHTS}) AS rank "
+            "FROM products_fts WHERE products_fts MATCH :match"
+        ).bindparams(match=match).columns(product_id=Integer, rank=Float).subquery("fts")
+        return query.join(fts, fts.c.product_id == model.id), fts.c.rank
+
+    if dialect == "postgresql" and _fts_ready["postgresql"]:
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("products.search_vector")
+        rank = -func.ts_rank_cd(vector, tsquery)
+        return query.filter(vector.op("@@")(tsquery)), rank
+
+    # Fallback: substring match on every searchable column
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(*[getattr(model, c).ilike(pattern) for c in FTS_COLUMNS]))
+    return query, None
@@ -0,0 +1,66 @@
+"""
+Stress test: fire concurrent overlapping bookings at one dress
+Run the server first (ideally like production: gunicorn -w 4 -k uvicorn.workers.UvicornWorker app.main:app),
+then: python test_booking_concurrency.py [BASE_URL] [RENTERS]
+"""
+
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from api_client import ApiClient
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+RENTERS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+RUN_ID = int(time.time())
+api = ApiClient(BASE_URL, timeout=60)
+
+
+print("\n" + "="*60)
+print("🏁 CONCURRENT BOOKING STRESS TEST")
+print("="*60)
+
+owner = api.register(f"stress_owner_{RUN_ID}", "Stress test")
+status, dress = api.call("POST", "/api/products", owner, form={
+    "name": f"Stress Test Lehenga {RUN_ID}",
+    "description": "Concurrency test dress",
+    "price_per_day": 100,
+    "category": "Lehenga",
+    "security_deposit": 0,
+})
+assert status == 200, dress
+print(f"Dress #{dress['id']} created")
+
+renters = [api.register(f"stress_renter_{RUN_ID}_{i}", "Stress test") for i in range(RENTERS)]
+
+# Every renter wants an overlapping slice of the same week
+def book(i):
+    start = 1 + i % 3
+    query = urllib.parse.urlencode({
+        "dress_id": dress["id"],
+        "start_date": f"2031-01-{start:02d}",
+        "end_date": f"2031-01-{start + 5:02d}",
+    })
+    return api.call("POST", f"/api/bookings/?{query}", renters[i])
+
+started = time.time()
+with ThreadPoolExecutor(max_workers=RENTERS) as pool:
+    results = list(pool.map(book, range(RENTERS)))
+elapsed = time.time() - started
+
+codes = {}
+for status, _ in results:
+    codes[status] = codes.get(status, 0) + 1
+print(f"Responses in {elapsed:.2f}s: {codes}")
+
+status, bookings = api.call("GET", f"/api/bookings/product/{dress['id']}")
+ranges = sorted((b["start_date"], b["end_date"]) for b in bookings)
+overlaps = [(a, b) for a, b in zip(ranges, ranges[1:]) if b[0] < a[1]]
+
+# 503 is a lock timeout the client may retry, never a second booking
+if codes.get(200, 0) == 1 and len(ranges) == 1 and not overlaps and set(codes) <= {200, 409, 503}:
+    print("✅ Exactly one booking won, every other request got 409 (or a retryable 503)")
+else:
+    print(f"❌ Double booking or unexpected errors: {ranges}")
+    sys.exit(1)
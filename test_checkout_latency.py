@@ -0,0 +1,63 @@
+"""
+Checkout latency for 1, 10 and 50 item carts
+Run the server first, then: python test_checkout_latency.py [BASE_URL] [RUNS]
+"""
+
+import statistics
+import sys
+import time
+
+from api_client import ApiClient
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+CART_SIZES = [1, 10, 50]
+RUN_ID = int(time.time())
+api = ApiClient(BASE_URL, timeout=120)
+
+
+print("\n" + "="*60)
+print("⏱️ CHECKOUT LATENCY")
+print("="*60)
+
+owner = api.register(f"latency_owner_{RUN_ID}", "Latency test")
+renter = api.register(f"latency_renter_{RUN_ID}", "Latency test")
+
+dress_ids = []
+for i in range(max(CART_SIZES)):
+    status, dress = api.call("POST", "/api/products", owner, form={
+        "name": f"Latency Test Gown {RUN_ID}-{i}",
+        "description": "Checkout latency test dress",
+        "price_per_day": 100 + i,
+        "category": "Gown",
+        "security_deposit": 50,
+    })
+    assert status == 200, dress
+    dress_ids.append(dress["id"])
+print(f"{len(dress_ids)} dresses created")
+
+# Every checkout books a fresh week so nothing conflicts
+week = 0
+for size in CART_SIZES:
+    timings = []
+    for _ in range(RUNS):
+        week += 1
+        start = time.strftime("%Y-%m-%d", time.gmtime(time.time() + 86400 * (400 + 7 * week)))
+        end = time.strftime("%Y-%m-%d", time.gmtime(time.time() + 86400 * (405 + 7 * week)))
+        for dress_id in dress_ids[:size]:
+            status, body = api.call("POST", "/api/cart", renter, json_body={
+                "product_id": dress_id,
+                "rental_start_date": start,
+                "rental_end_date": end,
+            })
+            assert status == 200, body
+
+        started = time.perf_counter()
+        status, body = api.call("POST", "/api/orders", renter)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert status == 200, body
+        assert len(body["items"]) == size, body
+
+    print(f"{size:>3} items: median {statistics.median(timings):7.1f} ms   min {min(timings):7.1f} ms   max {max(timings):7.1f} ms")
+
+print("="*60 + "\n")